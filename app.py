@@ -6,12 +6,18 @@
 #  app.py
 #  
 
+import json
+
 import yaml
-from flask import Flask
+from flask import Flask, Response
 from healthcheck import EnvironmentDump, HealthCheck
 
+import metrics
+from circuitbreaker import circuit_breaker_from_config
 from database import db_session, init_db, engine
+from jobs import JobAlreadyRunningException, JobRunner
 from vrt_metadata_updater import VrtMetadataUpdater
+from vrt_request_api import VrtRequestApiClient
 
 app = Flask(__name__)
 
@@ -24,25 +30,60 @@ DEFAULT_CFG_FILE = "./config.yml"
 with open(DEFAULT_CFG_FILE, "r") as ymlfile:
     cfg: dict = yaml.load(ymlfile, Loader=yaml.FullLoader)
 
+# Shared across requests so the pooled connections to the VRT request API are reused,
+# along with the circuit breaker its retried attempts report to
+vrt_request_api_client = VrtRequestApiClient(
+    cfg, circuit_breaker_from_config(cfg, "vrt_request_api")
+)
+
+# Runs /start in the background, at most one run at a time per database
+job_runner = JobRunner()
+
 @app.route("/start", methods=["POST"])
-def start() -> str:
-    """Starts the metadata updater with supplied config."""
-    vrt_metadata_updater = VrtMetadataUpdater(cfg)
+def start():
+    """Starts the metadata updater in the background and returns the id of the job."""
+    vrt_metadata_updater = VrtMetadataUpdater(cfg, vrt_request_api_client)
     try:
-        vrt_metadata_updater.start()
+        job_id = job_runner.start(vrt_metadata_updater.start)
+    except JobAlreadyRunningException as e:
+        return f"An error has occured. {e}", 409
     except Exception as e:
-        return f"An error has occured. {e}"
-    return "Requested an update for all items."
+        return f"An error has occured. {e}", 500
+    return json.dumps({"job_id": job_id}), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str):
+    """Gets the status of a job started with /start."""
+    job = job_runner.get(job_id)
+    if not job:
+        return f"Job {job_id} not found.", 404
+    return json.dumps(job, default=str)
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id: str):
+    """Asks a running job to stop after the requests that are in flight."""
+    job = job_runner.cancel(job_id)
+    if not job:
+        return f"Job {job_id} not found.", 404
+    return json.dumps(job, default=str)
 
 
 @app.route("/progress", methods=["GET"])
 def get_progress() -> str:
     """Gets the current progress by giving the amount of items in each status."""
-    vrt_metadata_updater = VrtMetadataUpdater(cfg)
+    vrt_metadata_updater = VrtMetadataUpdater(cfg, vrt_request_api_client)
 
     return vrt_metadata_updater.get_progress()
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Exposes the metrics of the updater in the Prometheus text format."""
+    return Response(metrics.generate_latest(), mimetype=metrics.CONTENT_TYPE_LATEST)
+
+
 @app.teardown_appcontext
 def shutdown_session(exception=None) -> None:
     db_session.remove()
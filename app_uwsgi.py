@@ -6,6 +6,15 @@
 #  app_uwsgi.py
 #  
 
+import os
+import shutil
+
+# metrics of the processes of an earlier start would be added to the new ones,
+# this runs in the uWSGI master before the workers are forked
+if os.environ.get("prometheus_multiproc_dir"):
+    shutil.rmtree(os.environ["prometheus_multiproc_dir"], ignore_errors=True)
+    os.makedirs(os.environ["prometheus_multiproc_dir"])
+
 from app import app as application
 from database import init_db
 
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  async_clients.py
+#
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+import aiohttp
+
+from circuitbreaker import OPEN, CircuitBreaker
+from mediahaven import (
+    AuthenticationException,
+    MediahavenException,
+    TokenManager,
+    check_fragments,
+    get_query,
+    get_token_manager,
+)
+from metrics import MEDIAHAVEN_PAGE_SECONDS, RETRIES
+from ratelimiter import TokenBucket
+from vrt_request_api import DEFAULT_RETRY_STATUS_CODES
+
+
+class AsyncMediahavenClient:
+    """asyncio counterpart of MediahavenClient.
+
+    Use it as an async context manager, it owns one pooled aiohttp session. The token
+    comes from the same TokenManager as the MediahavenClient of that user, a 401 drops
+    it and retries with a new one.
+    """
+
+    def __init__(self, config: dict, rate_limiter: TokenBucket = None):
+        self.cfg: dict = config
+        self.token_manager: TokenManager = get_token_manager(config)
+        self.rate_limiter: TokenBucket = rate_limiter or TokenBucket()
+        self.pool_size: int = self.cfg.get("mediahaven_prefetch_pages", 2) + 1
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncMediahavenClient":
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    async def __get_token(self) -> dict:
+        # only blocks when there is no valid token, the refresh is done in the background
+        return await asyncio.get_event_loop().run_in_executor(None, self.token_manager.get)
+
+    async def get_fragments(self, offset: int = 0, modified_since: datetime = None) -> dict:
+        """Gets a page of fragments for the configured media type, see MediahavenClient."""
+        token_info = await self.__get_token()
+        try:
+            return await self.__get_fragments(token_info, offset, modified_since)
+        except AuthenticationException:
+            RETRIES.labels("mediahaven").inc()
+            self.token_manager.invalidate(token_info)
+            token_info = await self.__get_token()
+        return await self.__get_fragments(token_info, offset, modified_since)
+
+    async def __get_fragments(
+        self, token_info: dict, offset: int, modified_since: datetime
+    ) -> dict:
+        headers: dict = {
+            "Authorization": f"Bearer {token_info['access_token']}",
+            "Accept": "application/vnd.mediahaven.v2+json",
+        }
+        params: dict = {
+            "q": get_query(self.cfg, modified_since),
+            "startIndex": offset,
+            "nrOfResults": self.cfg["nr_of_results"],
+        }
+        await asyncio.sleep(self.rate_limiter.reserve())
+        start = time.monotonic()
+        async with self.session.get(
+            self.cfg["environment"]["mediahaven"]["host"] + "/media/",
+            headers=headers,
+            params=params,
+        ) as response:
+            self.rate_limiter.report(response.status)
+            if response.status == 401:
+                raise AuthenticationException(await response.text())
+            if response.status != 200:
+                text = await response.text()
+                raise MediahavenException(
+                    f"Failed to get fragments. Status: {response.status}: {text[:200]}"
+                )
+            media_data = check_fragments(await response.json(content_type=None))
+        MEDIAHAVEN_PAGE_SECONDS.observe(time.monotonic() - start)
+        return media_data
+
+    async def iter_fragment_pages(
+        self, offset: int = 0, first_page: dict = None, modified_since: datetime = None
+    ) -> AsyncIterator[dict]:
+        """Yields all pages of fragments, starting from the given offset.
+
+        Like MediahavenClient.iter_fragment_pages every page starts where the previous
+        one ended, and the next page is fetched while the caller handles the current one.
+        """
+        page = first_page if first_page is not None else await self.get_fragments(offset, modified_since)
+        next_page: Optional[asyncio.Future] = None
+        try:
+            while True:
+                returned: int = len(page["MediaDataList"])
+                offset += returned
+                if returned and offset < page["TotalNrOfResults"]:
+                    next_page = asyncio.ensure_future(self.get_fragments(offset, modified_since))
+                yield page
+                if next_page is None:
+                    return
+                page, next_page = await next_page, None
+        finally:
+            # Stop prefetching when the caller stops early
+            if next_page is not None:
+                next_page.cancel()
+
+
+class AsyncVrtRequestApiClient:
+    """asyncio counterpart of VrtRequestApiClient.
+
+    Use it as an async context manager, it owns one pooled aiohttp session. The same
+    `environment.vrt_request_api` settings are used, `pool_size` limits the number of
+    connections and `retries` with `backoff_factor` the retries on connection errors
+    and on `retry_status_codes`. Like VrtRequestApiClient, failed attempts are
+    reported to `circuit_breaker` and the retries are given up once it is open.
+    """
+
+    def __init__(self, config: dict, circuit_breaker: CircuitBreaker = None):
+        api_cfg: dict = config.get("environment", {}).get("vrt_request_api") or {}
+        self.circuit_breaker: Optional[CircuitBreaker] = circuit_breaker
+        self.host: str = api_cfg.get("host")
+        self.pool_size: int = api_cfg.get("pool_size", max(config.get("concurrency", 1), 10))
+        self.retries: int = api_cfg.get("retries", 10)
+        self.backoff_factor: float = api_cfg.get("backoff_factor", 0.5)
+        self.retry_status_codes: list = api_cfg.get(
+            "retry_status_codes", DEFAULT_RETRY_STATUS_CODES
+        )
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncVrtRequestApiClient":
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    async def post_update_request(self, payload: dict) -> Tuple[int, Optional[dict]]:
+        """Sends a metadata update request, retrying with an exponential backoff.
+
+        Arguments:
+            payload {dict} -- the update request body
+
+        Raises:
+            aiohttp.ClientError: when the last retry failed to connect
+
+        Returns:
+            Tuple -- the status code and the JSON body, None if the body is no JSON
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                RETRIES.labels("vrt_request_api").inc()
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            try:
+                async with self.session.post(self.host, data=json.dumps(payload)) as response:
+                    if (
+                        response.status in self.retry_status_codes
+                        and attempt < self.retries
+                        and not self.__give_up(response.status)
+                    ):
+                        continue
+                    try:
+                        return response.status, await response.json(content_type=None)
+                    except ValueError:
+                        return response.status, None
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries or self.__give_up(None):
+                    raise
+
+    def __give_up(self, status_code: Optional[int]) -> bool:
+        """Reports a failed attempt that would be retried, True when the circuit breaker
+        opened and the retries should be given up.
+        """
+        if self.circuit_breaker is None:
+            return False
+        self.circuit_breaker.report(status_code)
+        return self.circuit_breaker.state == OPEN
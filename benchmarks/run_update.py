@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  benchmarks/run_update.py
+#
+#  Runs the updater against the local stand-ins (see standins.py) on a fresh
+#  database and reports, per phase, the items per second, the p50/p99 latency of
+#  the requests, the peak RSS and the time spent writing to the database. Results
+#  are appended to a JSON lines file and compared with the last run with the same
+#  parameters.
+#
+#  The report is written to stderr, the log lines of the updater go to stdout.
+#
+#  Usage: python benchmarks/run_update.py [--items 100000] [--latency 0.005] [--help]
+#
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# a fresh SQLite database per run, unless DATABASE_URL points to another database
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'database.db')}"
+)
+
+from async_clients import AsyncMediahavenClient, AsyncVrtRequestApiClient  # noqa: E402
+from database import Base, db_session, engine, init_db  # noqa: E402
+from mediahaven import MediahavenClient  # noqa: E402
+from models import MediaObject  # noqa: E402
+from standins import StandIns  # noqa: E402
+from vrt_metadata_updater import VrtMetadataUpdater  # noqa: E402
+
+DEFAULT_RESULTS_FILE = os.path.join(os.path.dirname(__file__), "results.jsonl")
+
+
+class Timings:
+    """Collects how long the calls to wrapped functions take."""
+
+    def __init__(self):
+        self.durations: List[float] = list()
+        self.lock = threading.Lock()
+
+    def add(self, duration: float) -> None:
+        with self.lock:
+            self.durations.append(duration)
+
+    def wrap(self, function: Callable) -> Callable:
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(time.perf_counter() - start)
+
+        return timed
+
+    def wrap_async(self, function: Callable) -> Callable:
+        @functools.wraps(function)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                self.add(time.perf_counter() - start)
+
+        return timed
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.durations:
+            return None
+        durations = sorted(self.durations)
+        return durations[min(len(durations) - 1, int(len(durations) * percent / 100))]
+
+    def total(self) -> float:
+        return sum(self.durations)
+
+
+def reset_peak_rss() -> bool:
+    """Resets the peak RSS of this process, so it is measured per phase.
+
+    Returns:
+        bool -- False where that is not supported (not Linux), the peak is then the
+        one of the whole process so far
+    """
+    try:
+        # see "/proc/[pid]/clear_refs" in proc(5), 5 resets VmHWM
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak RSS since the last reset, see `reset_peak_rss`."""
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def count_handled() -> int:
+    """Returns the number of media objects that got an update request."""
+    count = db_session.query(MediaObject).filter(MediaObject.status != 0).count()
+    db_session.commit()
+    return count
+
+
+def measure(name: str, run: Callable[[], int], requests: Timings, db_writes: Timings) -> dict:
+    """Runs a phase and returns its measurements, `run` returns the number of items."""
+    requests.durations.clear()
+    db_writes.durations.clear()
+    per_phase = reset_peak_rss()
+    start = time.perf_counter()
+    items = run()
+    duration = time.perf_counter() - start
+    p50, p99 = requests.percentile(50), requests.percentile(99)
+    return {
+        "phase": name,
+        "items": items,
+        "seconds": round(duration, 3),
+        "items_per_second": round(items / duration, 1) if duration else None,
+        "requests": len(requests.durations),
+        "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+        "p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_scope": "phase" if per_phase else "process",
+        "db_write_seconds": round(db_writes.total(), 3),
+    }
+
+
+def run_threaded(cfg: dict) -> List[dict]:
+    """The harvest and the update requests one after the other, like `start`."""
+    requests, db_writes = Timings(), Timings()
+    updater = VrtMetadataUpdater(cfg)
+    updater.write_media_ids_to_db = db_writes.wrap(updater.write_media_ids_to_db)
+    updater.status_writer.flush = db_writes.wrap(updater.status_writer.flush)
+    vrt_client = updater.vrt_request_api_client
+    vrt_client.post_update_request = requests.wrap(vrt_client.post_update_request)
+    vrt_client.post_batch_update_request = requests.wrap(vrt_client.post_batch_update_request)
+    mediahaven_client = MediahavenClient(cfg)
+    mediahaven_client.get_fragments = requests.wrap(mediahaven_client.get_fragments)
+
+    def harvest() -> int:
+        pages = mediahaven_client.iter_fragment_pages()
+        return sum(len(media_ids) for media_ids in updater.harvest(pages, datetime.utcnow()))
+
+    def update() -> int:
+        updater.process_media_objects(updater.iter_pending_media_objects())
+        return count_handled()
+
+    return [
+        measure("harvest", harvest, requests, db_writes),
+        measure("update", update, requests, db_writes),
+    ]
+
+
+def run_async(cfg: dict) -> List[dict]:
+    """The asyncio run, which harvests and sends update requests at the same time."""
+    requests, db_writes = Timings(), Timings()
+    updater = VrtMetadataUpdater(cfg)
+    updater.write_media_ids_to_db = db_writes.wrap(updater.write_media_ids_to_db)
+    updater.status_writer.flush = db_writes.wrap(updater.status_writer.flush)
+    AsyncMediahavenClient.get_fragments = requests.wrap_async(AsyncMediahavenClient.get_fragments)
+    AsyncVrtRequestApiClient.post_update_request = requests.wrap_async(
+        AsyncVrtRequestApiClient.post_update_request
+    )
+
+    def harvest_and_update() -> int:
+        asyncio.run(updater.start_async())
+        return count_handled()
+
+    return [measure("harvest+update", harvest_and_update, requests, db_writes)]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(results_file: str, parameters: dict) -> Optional[dict]:
+    """Returns the last result with the same parameters, if there is one."""
+    previous = None
+    if os.path.exists(results_file):
+        with open(results_file, "r") as results:
+            for line in results:
+                result = json.loads(line)
+                if result["parameters"] == parameters:
+                    previous = result
+    return previous
+
+
+def report(result: dict, previous: Optional[dict]) -> None:
+    out = sys.stderr
+    print(f"\n{result['parameters']}", file=out)
+    print(
+        f"{'phase':<16}{'items':>9}{'seconds':>10}{'items/s':>11}{'requests':>10}"
+        f"{'p50 ms':>9}{'p99 ms':>9}{'rss MB':>9}{'db s':>8}",
+        file=out,
+    )
+    previous = previous or {"commit": None, "phases": []}
+    previous_phases = {phase["phase"]: phase for phase in previous["phases"]}
+    for phase in result["phases"]:
+        line = (
+            f"{phase['phase']:<16}{phase['items']:>9}{phase['seconds']:>10}"
+            f"{phase['items_per_second']!s:>11}{phase['requests']:>10}{phase['p50_ms']!s:>9}"
+            f"{phase['p99_ms']!s:>9}{phase['peak_rss_mb']:>9}{phase['db_write_seconds']:>8}"
+        )
+        before = previous_phases.get(phase["phase"])
+        if before and before["items_per_second"] and phase["items_per_second"]:
+            change = phase["items_per_second"] / before["items_per_second"] - 1
+            line += f"  {change:+.0%} items/s vs {previous['commit'] or 'previous run'}"
+        print(line, file=out)
+    if any(phase.get("peak_rss_scope") != "phase" for phase in result["phases"]):
+        print("rss MB is the peak of the whole process so far, not of the phase", file=out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks a run against local stand-ins.")
+    parser.add_argument("--items", type=int, default=20000, help="size of the collection")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="failing update requests")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1, help="media ids per update request")
+    parser.add_argument("--retries", type=int, default=0, help="retries per update request")
+    parser.add_argument("--pages-per-transaction", type=int, default=1)
+    parser.add_argument("--mode", choices=["threaded", "async"], default="threaded")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE, help="JSON lines file")
+    args = parser.parse_args()
+    parameters = {
+        key: value for key, value in vars(args).items() if key != "output"
+    }
+    parameters["database"] = engine.dialect.name
+
+    stand_ins = StandIns(
+        collection_size=args.items,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    ).start()
+    cfg = {
+        "environment": {
+            "mediahaven": {
+                "host": stand_ins.url,
+                "username": "benchmark",
+                "password": "benchmark",
+            },
+            "vrt_request_api": {
+                "host": stand_ins.url + "/vrt",
+                "batch_host": stand_ins.url + "/vrt/batch",
+                "retries": args.retries,
+                "backoff_factor": 0,
+            },
+        },
+        "media_type": "video",
+        "nr_of_results": args.page_size,
+        "max_amount_to_process": 0,
+        "skip_mediahaven": False,
+        "concurrency": args.concurrency,
+        "max_requests_per_second": 0,
+        "update_batch_size": args.batch_size,
+        "harvest_pages_per_transaction": args.pages_per_transaction,
+        "mediahaven_streaming_json": True,
+    }
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    try:
+        phases = run_async(cfg) if args.mode == "async" else run_threaded(cfg)
+    finally:
+        stand_ins.stop()
+
+    result = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "parameters": parameters,
+        "phases": phases,
+    }
+    report(result, load_previous(args.output, parameters))
+    with open(args.output, "a") as results:
+        results.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
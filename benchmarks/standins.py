@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  benchmarks/standins.py
+#
+#  Local HTTP stand-ins for MediaHaven and the VRT request API, so a run can be
+#  measured without touching the real services.
+#
+#  Usage: python benchmarks/standins.py [port]
+#
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StandIns:
+    """Serves `/oauth/access_token`, `/media/` paging, `/vrt` and `/vrt/batch`.
+
+    Every request waits `latency` seconds (plus up to `jitter` seconds) before it is
+    answered. A fraction `error_rate` of the update requests fails, half of them with
+    a 503 and half with a 200 whose status is not OK.
+    """
+
+    def __init__(
+        self,
+        collection_size: int = 10000,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        port: int = 0,
+        seed: int = 42,
+    ):
+        self.collection_size: int = collection_size
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests: dict = {"token": 0, "media": 0, "vrt": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.__handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandIns":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def roll(self) -> float:
+        """Returns a random number in [0, 1), reproducible for the same seed."""
+        with self.random_lock:
+            return self.random.random()
+
+    def wait(self) -> None:
+        delay = self.latency + self.roll() * self.jitter
+        if delay:
+            time.sleep(delay)
+
+    def fails(self) -> bool:
+        return self.roll() < self.error_rate
+
+    def __handler(self):
+        stand_ins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, without this every response
+            # waits for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self) -> None:
+                body = self.read_body()
+                stand_ins.wait()
+                path = urlparse(self.path).path
+                if path == "/oauth/access_token":
+                    stand_ins.requests["token"] += 1
+                    self.send_json(201, {"access_token": "benchmark", "expires_in": 3600})
+                elif path == "/vrt":
+                    stand_ins.requests["vrt"] += 1
+                    if stand_ins.fails():
+                        if stand_ins.roll() < 0.5:
+                            self.send_json(503, {"status": "unavailable"})
+                        else:
+                            self.send_json(200, {"status": "NOK"})
+                    else:
+                        self.send_json(200, {"status": "OK"})
+                elif path == "/vrt/batch":
+                    stand_ins.requests["vrt"] += 1
+                    payloads = json.loads(body)["requests"]
+                    self.send_json(200, {"results": [
+                        {
+                            "media_id": payload["media_id"],
+                            "status": "NOK" if stand_ins.fails() else "OK",
+                        }
+                        for payload in payloads
+                    ]})
+                else:
+                    self.send_json(404, {})
+
+            def do_GET(self) -> None:
+                stand_ins.wait()
+                url = urlparse(self.path)
+                if url.path != "/media/":
+                    self.send_json(404, {})
+                    return
+                stand_ins.requests["media"] += 1
+                query = parse_qs(url.query)
+                offset = int(query.get("startIndex", ["0"])[0])
+                number = int(query.get("nrOfResults", ["1000"])[0])
+                items = range(offset, min(offset + number, stand_ins.collection_size))
+                self.send_json(200, {
+                    "TotalNrOfResults": stand_ins.collection_size,
+                    "MediaDataList": [
+                        {"Dynamic": {"dc_identifier_localid": f"id{i:08d}", "dc_title": "title"}}
+                        for i in items
+                    ],
+                })
+
+        return Handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    stand_ins = StandIns(port=port).start()
+    print(f"Serving stand-ins on {stand_ins.url}, ctrl-c to stop.")
+    try:
+        stand_ins.thread.join()
+    except KeyboardInterrupt:
+        stand_ins.stop()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  benchmarks/write_media_ids.py
+#
+#  Compares writing harvested pages through MediaObject instances (the old path)
+#  with writing the plain media ids, per page and in multi-page transactions.
+#
+#  Usage: python benchmarks/write_media_ids.py [number of ids] [page size]
+#
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from database import Base, insert_ignore  # noqa: E402
+from models import MediaObject  # noqa: E402
+
+
+def make_pages(number_of_ids: int, page_size: int) -> list:
+    return [
+        {
+            "MediaDataList": [
+                {"Dynamic": {"dc_identifier_localid": f"id{i:08d}", "dc_title": "title"}}
+                for i in range(start, min(start + page_size, number_of_ids))
+            ]
+        }
+        for start in range(0, number_of_ids, page_size)
+    ]
+
+
+def write_media_objects(connection, pages: list, pages_per_transaction: int) -> None:
+    statement = MediaObject.__table__.insert(prefixes=["OR IGNORE"])
+    for media_data in pages:
+        media_objects = [
+            MediaObject(item["Dynamic"]["dc_identifier_localid"])
+            for item in media_data["MediaDataList"]
+            if "dc_identifier_localid" in item["Dynamic"]
+        ]
+        with connection.begin():
+            connection.execute(statement, [media_object.get_dict() for media_object in media_objects])
+
+
+def write_media_ids(connection, pages: list, pages_per_transaction: int) -> None:
+    statement = insert_ignore(MediaObject.__table__)
+    transaction = connection.begin()
+    for number, media_data in enumerate(pages, 1):
+        now = datetime.now()
+        media_ids = [
+            item["Dynamic"]["dc_identifier_localid"]
+            for item in media_data["MediaDataList"]
+            if "dc_identifier_localid" in item["Dynamic"]
+        ]
+        connection.execute(
+            statement,
+            [{"vrt_media_id": media_id, "status": 0, "last_update": now} for media_id in media_ids],
+        )
+        if number % pages_per_transaction == 0:
+            transaction.commit()
+            transaction = connection.begin()
+    transaction.commit()
+
+
+def run(name: str, write, pages: list, pages_per_transaction: int = 1) -> None:
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'database.db')}")
+    Base.metadata.create_all(bind=engine)
+    number_of_ids = sum(len(media_data["MediaDataList"]) for media_data in pages)
+
+    with engine.connect() as connection:
+        start = time.perf_counter()
+        write(connection, pages, pages_per_transaction)
+        duration = time.perf_counter() - start
+    engine.dispose()
+    print(f"{name:<40} {duration:8.2f}s {number_of_ids / duration:12.0f} ids/s")
+
+
+if __name__ == "__main__":
+    number_of_ids = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    pages = make_pages(number_of_ids, page_size)
+
+    run("MediaObject + get_dict, 1 page/commit", write_media_objects, pages)
+    run("media ids, 1 page/commit", write_media_ids, pages)
+    run("media ids, 10 pages/commit", write_media_ids, pages, 10)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  circuitbreaker.py
+#
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from viaa.configuration import ConfigParser
+from viaa.observability import logging
+
+from metrics import CIRCUIT_BREAKER_STATE
+
+logger = logging.get_logger(config=ConfigParser())
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# values of the circuit breaker state metric
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker that stops requests to a service that is down.
+
+    While closed, the outcome of the last `window` requests is kept. When at least
+    `error_rate` of them failed (no response, 429 or 5xx), the breaker opens and no
+    request may start for `open_duration` seconds. Then it is half-open: a single probe
+    request is let through. When it succeeds the breaker closes again, otherwise it
+    opens for another `open_duration`. An error rate of 0 disables the breaker.
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0,
+        window: int = 20,
+        open_duration: float = 30,
+        name: str = "default",
+        poll_interval: float = 0.1,
+    ):
+        self.error_rate: float = error_rate
+        self.open_duration: float = open_duration
+        self.name: str = name
+        self.poll_interval: float = poll_interval
+        self.outcomes: Deque[bool] = deque(maxlen=max(window, 1))
+        self.state: str = CLOSED
+        self.opened_until: float = 0
+        self.probe_started: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a request is allowed to start.
+
+        Returns:
+            float -- the number of seconds waited
+        """
+        waited = 0.0
+        delay = self.reserve()
+        while delay:
+            time.sleep(delay)
+            waited += delay
+            delay = self.reserve()
+        return waited
+
+    def reserve(self) -> float:
+        """Checks without blocking whether a request may start, for asyncio callers.
+
+        Returns:
+            float -- 0 when the request may start, otherwise the number of seconds to
+            wait before asking again
+        """
+        if not self.error_rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now < self.opened_until:
+                    return self.opened_until - now
+                self.__set_state(HALF_OPEN)
+                self.probe_started = None
+            if self.state == HALF_OPEN:
+                # a probe that never reported back does not block the breaker forever
+                if self.probe_started is not None and now - self.probe_started < self.open_duration:
+                    return self.poll_interval
+                self.probe_started = now
+            return 0
+
+    def report(self, status_code: Optional[int]) -> None:
+        """Records the outcome of a finished request, None when there was no response."""
+        if not self.error_rate:
+            return
+        failed: bool = status_code is None or status_code == 429 or status_code >= 500
+        with self.lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self.__open()
+                else:
+                    logger.info(f"Circuit breaker of {self.name} closed, the probe succeeded.")
+                    self.__set_state(CLOSED)
+            elif self.state == CLOSED:
+                self.outcomes.append(failed)
+                if (
+                    len(self.outcomes) == self.outcomes.maxlen
+                    and sum(self.outcomes) / len(self.outcomes) >= self.error_rate
+                ):
+                    self.__open()
+            # late responses of requests started before the breaker opened are ignored
+
+    def __open(self) -> None:
+        logger.warning(
+            f"Circuit breaker of {self.name} opened, pausing requests for {self.open_duration} seconds."
+        )
+        self.__set_state(OPEN)
+        self.opened_until = time.monotonic() + self.open_duration
+        self.outcomes.clear()
+
+    def __set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(STATE_VALUES[state])
+
+
+def circuit_breaker_from_config(config: dict, name: str) -> CircuitBreaker:
+    """Returns a circuit breaker with the circuit_breaker_* settings of the config."""
+    return CircuitBreaker(
+        error_rate=config.get("circuit_breaker_error_rate", 0.5),
+        window=config.get("circuit_breaker_window", 20),
+        open_duration=config.get("circuit_breaker_open_duration", 30),
+        name=name,
+    )
@@ -6,11 +6,73 @@
 #  database.py
 #
 
-from sqlalchemy import create_engine
+import os
+
+import yaml
+from sqlalchemy import Table, create_engine, event, inspect
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.sql.expression import Insert
+
+DEFAULT_CFG_FILE = "./config.yml"
+DEFAULT_DATABASE_URL = "sqlite:///database.db"
+
+
+def load_database_config(config_file: str = DEFAULT_CFG_FILE) -> dict:
+    """Returns the `database` section of the config file, empty if there is none."""
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, "r") as ymlfile:
+        cfg: dict = yaml.load(ymlfile, Loader=yaml.FullLoader) or {}
+    return cfg.get("database") or {}
+
+
+def create_database_engine(database_cfg: dict) -> Engine:
+    """Creates the engine for the configured database, SQLite when nothing is configured.
+
+    The DATABASE_URL environment variable takes precedence over the configured url,
+    e.g. to run the tests against PostgreSQL. The pool settings only apply to
+    databases with a connection pool, not to SQLite.
+    """
+    url: str = os.environ.get("DATABASE_URL") or database_cfg.get("url") or DEFAULT_DATABASE_URL
+    if url.startswith("sqlite"):
+        database_engine = create_engine(url)
+        event.listen(database_engine, "connect", set_sqlite_pragmas)
+        return database_engine
+    options: dict = {}
+    if make_url(url).drivername in ("postgresql", "postgresql+psycopg2"):
+        # one statement per page of rows instead of one per row for executemany
+        options["executemany_mode"] = "values"
+    return create_engine(
+        url,
+        **options,
+        pool_size=database_cfg.get("pool_size", 5),
+        max_overflow=database_cfg.get("max_overflow", 10),
+        # reconnect before the server or a proxy in between drops idle connections
+        pool_recycle=database_cfg.get("pool_recycle", 1800),
+        pool_pre_ping=True,
+    )
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Lets readers (e.g. /progress) and the updater use the database at the same time.
+
+    WAL keeps reads from blocking the writer, with synchronous NORMAL a commit no
+    longer waits for an fsync.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+engine = create_database_engine(load_database_config())
 
-engine = create_engine("sqlite:///database.db")
 db_session = scoped_session(
     sessionmaker(autocommit=False, autoflush=False, bind=engine)
 )
@@ -22,5 +84,37 @@ def init_db() -> None:
     from models import MediaObject
 
     Base.metadata.create_all(bind=engine)
+    upgrade_db()
 
     db_session.commit()
+
+
+def upgrade_db() -> None:
+    """Adds what is missing from tables that were created by an older version."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=engine.dialect)
+                quote = engine.dialect.identifier_preparer.quote
+                engine.execute(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                )
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+
+
+def insert_ignore(table: Table, dialect_name: str = None) -> Insert:
+    """Returns an INSERT for the table that skips rows whose primary key already exists.
+
+    Keyword Arguments:
+        dialect_name {str} -- the database it is for (default: {the dialect of the engine})
+    """
+    dialect_name = dialect_name or engine.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return table.insert(prefixes=["OR IGNORE"])
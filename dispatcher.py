@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  dispatcher.py
+#
+
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from circuitbreaker import CircuitBreaker
+from ratelimiter import ConcurrencyLimit, TokenBucket
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Groups the items in lists of `size`, the last one may be shorter."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Dispatcher:
+    """Sends items with a bounded number of requests in flight.
+
+    The results are handed to `on_result` in the thread that called `dispatch`, so
+    callers can keep using their (thread-local) database session. An item can also be
+    a batch that is sent in one request, see `batched`.
+
+    With a `concurrency_limit` the number of requests in flight follows that limit, up
+    to its maximum, instead of `concurrency`. No request starts while the
+    `circuit_breaker` is open.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any], Any],
+        concurrency: int = 1,
+        rate_limiter: TokenBucket = None,
+        concurrency_limit: ConcurrencyLimit = None,
+        circuit_breaker: CircuitBreaker = None,
+    ):
+        self.send = send
+        self.concurrency_limit: ConcurrencyLimit = concurrency_limit or ConcurrencyLimit(
+            concurrency, min_limit=concurrency
+        )
+        self.concurrency: int = self.concurrency_limit.max_limit
+        self.rate_limiter: TokenBucket = rate_limiter or TokenBucket()
+        self.circuit_breaker: CircuitBreaker = circuit_breaker or CircuitBreaker()
+
+    def dispatch(
+        self, items: Iterable[Any], on_result: Callable[[Any, Any], None]
+    ) -> None:
+        """Sends every item and reports the outcome of each request.
+
+        Arguments:
+            items {Iterable} -- the items to send
+            on_result {Callable} -- called with the item and the result of `send` per request
+        """
+        in_flight: Dict = dict()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for item in items:
+                while len(in_flight) >= self.concurrency_limit.limit:
+                    self.__collect(in_flight, on_result, FIRST_COMPLETED)
+                self.circuit_breaker.acquire()
+                self.rate_limiter.acquire()
+                in_flight[executor.submit(self.send, item)] = item
+            self.__collect(in_flight, on_result, ALL_COMPLETED)
+
+    def __collect(
+        self, in_flight: Dict, on_result: Callable[[Any, Any], None], return_when: str
+    ) -> None:
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            item = in_flight.pop(future)
+            on_result(item, future.result())
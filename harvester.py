@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  harvester.py
+#
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from viaa.configuration import ConfigParser
+from viaa.observability import logging
+
+from database import db_session
+from mediahaven import MediahavenClient
+from models import HarvestPartition
+
+logger = logging.get_logger(config=ConfigParser())
+
+
+class PartitionedHarvester:
+    """Harvests MediaHaven with several workers, each fetching and writing its own range
+    of offsets.
+
+    The ranges (partitions) are stored in the database and marked as completed one by
+    one, so an interrupted harvest only fetches the partitions that are missing.
+    """
+
+    def __init__(
+        self,
+        mediahaven_client: MediahavenClient,
+        write_page: Callable[[dict], bool],
+        workers: int = 4,
+        partition_pages: int = 10,
+        page_size: int = 1000,
+        is_cancelled: Callable[[], bool] = lambda: False,
+    ):
+        self.mediahaven_client = mediahaven_client
+        self.write_page = write_page
+        self.workers: int = max(workers, 1)
+        self.partition_size: int = max(partition_pages, 1) * page_size
+        self.page_size: int = page_size
+        self.is_cancelled = is_cancelled
+
+    def harvest(self, media_type: str, total: int, modified_since: datetime = None) -> bool:
+        """Harvests all partitions that are not completed yet.
+
+        Arguments:
+            media_type {str} -- the media type that is harvested
+            total {int} -- the number of results MediaHaven reported
+
+        Keyword Arguments:
+            modified_since {datetime} -- only harvest items changed since then (default: {None})
+
+        Returns:
+            bool -- True if every partition is completed
+        """
+        partitions = self.__plan(media_type, total, modified_since)
+        logger.debug(f"Harvesting {len(partitions)} partitions with {self.workers} workers.")
+
+        completed = True
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(self.__harvest_partition, media_type, start, end, modified_since)
+                for start, end in partitions
+            ]
+            for future in as_completed(futures):
+                try:
+                    completed = future.result() and completed
+                except Exception as exception:
+                    logger.warning(f"Failed to harvest a partition: {exception}")
+                    completed = False
+        return completed
+
+    def __plan(self, media_type: str, total: int, modified_since: datetime) -> List[Tuple[int, int]]:
+        """Returns the (start, end) offsets to harvest, resuming an unfinished plan."""
+        partitions: List[HarvestPartition] = (
+            db_session.query(HarvestPartition).filter(HarvestPartition.media_type == media_type).all()
+        )
+        resumable = partitions and all(
+            partition.total == total and partition.modified_since == modified_since
+            for partition in partitions
+        )
+        if resumable and not all(partition.completed for partition in partitions):
+            pending = [
+                (partition.start, partition.end) for partition in partitions if not partition.completed
+            ]
+            logger.debug(f"Resuming harvest, {len(pending)} of {len(partitions)} partitions left.")
+        else:
+            db_session.query(HarvestPartition).filter(
+                HarvestPartition.media_type == media_type
+            ).delete()
+            pending = [
+                (start, min(start + self.partition_size, total))
+                for start in range(0, total, self.partition_size)
+            ]
+            db_session.add_all(
+                HarvestPartition(media_type, start, end, total, modified_since)
+                for start, end in pending
+            )
+        db_session.commit()
+        return pending
+
+    def __harvest_partition(
+        self, media_type: str, start: int, end: int, modified_since: datetime
+    ) -> bool:
+        """Fetches and writes every page of a partition, then marks it as completed.
+
+        Like the sequential pager, every page starts where the previous one ended, as
+        MediaHaven may return less than `page_size` items per page. A partition that
+        runs out of items before its end is not completed.
+        """
+        try:
+            offset = start
+            while offset < end:
+                if self.is_cancelled():
+                    return False
+                media_data = self.mediahaven_client.get_fragments(
+                    offset=offset, modified_since=modified_since
+                )
+                if not self.write_page(media_data):
+                    return False
+                returned: int = len(media_data["MediaDataList"])
+                if not returned:
+                    logger.warning(f"No items returned at offset {offset}, before {end}.")
+                    return False
+                offset += returned
+
+            db_session.query(HarvestPartition).filter(
+                HarvestPartition.media_type == media_type, HarvestPartition.start == start
+            ).update({"completed": True})
+            db_session.commit()
+            return True
+        except SQLAlchemyError as exception:
+            db_session.rollback()
+            logger.warning(f"Failed to mark the partition at offset {start} as completed.")
+            return False
+        finally:
+            db_session.remove()
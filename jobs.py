@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  jobs.py
+#
+
+import fcntl
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from viaa.configuration import ConfigParser
+from viaa.observability import logging
+
+from database import db_session, engine
+from models import Job
+
+logger = logging.get_logger(config=ConfigParser())
+
+# identifies the advisory lock of update runs on PostgreSQL
+JOB_LOCK_KEY = 7424590
+
+
+class JobAlreadyRunningException(Exception):
+    """Exception raised when a run is started while another one is active."""
+    pass
+
+
+class AdvisoryLock:
+    """A PostgreSQL advisory lock, held by its own connection until it is closed.
+
+    The server releases it when the connection is lost, so like a lock file it does
+    not outlive a process that dies, but it holds for every pod using the database.
+    """
+
+    def __init__(self, key: int):
+        self.key: int = key
+        self.connection = engine.connect()
+        self.locked: bool = False
+
+    def acquire(self) -> bool:
+        """Takes the lock if it is free, without waiting."""
+        self.locked = bool(
+            self.connection.execute(select([func.pg_try_advisory_lock(self.key)])).scalar()
+        )
+        return self.locked
+
+    def close(self) -> None:
+        try:
+            if self.locked:
+                self.connection.execute(select([func.pg_advisory_unlock(self.key)]))
+        finally:
+            self.connection.close()
+
+
+class JobRunner:
+    """Runs an update in a background thread and keeps track of it in the database.
+
+    Only one run can be active per database. On SQLite this is enforced with a lock
+    file next to the database, which the OS releases when the process dies, so it
+    holds for every uWSGI process in the pod. On PostgreSQL an advisory lock is used
+    instead, which holds for every pod. Because jobs are stored in the database, any
+    process can report on or cancel them.
+    """
+
+    def __init__(self, lock_file: str = None, cancel_check_interval: float = 2):
+        self.lock_file: str = lock_file or f"{engine.url.database or 'database'}.lock"
+        self.cancel_check_interval: float = cancel_check_interval
+
+    def start(self, run: Callable[[Callable[[], bool]], None]) -> str:
+        """Starts a run in the background.
+
+        Arguments:
+            run {Callable} -- called with a function that tells if the job was cancelled
+
+        Raises:
+            JobAlreadyRunningException: when another run holds the lock
+
+        Returns:
+            str -- the id of the new job
+        """
+        lock = self.__lock()
+
+        try:
+            # Holding the lock means any job still marked as running has died
+            db_session.query(Job).filter(Job.status == Job.RUNNING).update(
+                {"status": Job.FAILED, "error": "interrupted", "finished_at": datetime.now()}
+            )
+            job = Job(uuid.uuid4().hex)
+            db_session.add(job)
+            db_session.commit()
+            job_id: str = job.id
+        except SQLAlchemyError:
+            db_session.rollback()
+            lock.close()
+            raise
+
+        thread = threading.Thread(
+            target=self.__run, args=(job_id, run, lock), name=f"job-{job_id}", daemon=True
+        )
+        thread.start()
+        return job_id
+
+    def __lock(self):
+        """Takes the single-flight lock, the returned object releases it when closed.
+
+        Raises:
+            JobAlreadyRunningException: when another run holds the lock
+        """
+        if engine.dialect.name == "postgresql":
+            lock = AdvisoryLock(JOB_LOCK_KEY)
+            if lock.acquire():
+                return lock
+        else:
+            lock = open(self.lock_file, "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock
+            except OSError:
+                pass
+        lock.close()
+        raise JobAlreadyRunningException("An update is already running.")
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Returns the job as a dict, or None if it does not exist."""
+        job: Job = db_session.query(Job).get(job_id)
+        return job.get_dict() if job else None
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Asks a running job to stop, it stops within `cancel_check_interval` seconds.
+
+        Returns:
+            dict -- the job, or None if it does not exist
+        """
+        job: Job = db_session.query(Job).get(job_id)
+        if not job:
+            return None
+        if job.status == Job.RUNNING:
+            job.cancel_requested = True
+            db_session.commit()
+        return job.get_dict()
+
+    def __run(self, job_id: str, run: Callable, lock) -> None:
+        is_cancelled = self.__cancel_checker(job_id)
+        status, error = Job.FINISHED, None
+        try:
+            run(is_cancelled)
+            if is_cancelled():
+                status = Job.CANCELLED
+        except Exception as exception:
+            logger.error(f"Job {job_id} failed: {exception}")
+            status, error = Job.FAILED, str(exception)
+        finally:
+            try:
+                db_session.query(Job).filter(Job.id == job_id).update(
+                    {"status": status, "error": error, "finished_at": datetime.now()}
+                )
+                db_session.commit()
+            except SQLAlchemyError:
+                db_session.rollback()
+                logger.warning(f"Failed to store the status of job {job_id}.")
+            db_session.remove()
+            lock.close()
+
+    def __cancel_checker(self, job_id: str) -> Callable[[], bool]:
+        """Returns a function that looks up the cancel flag at most once per interval."""
+        state = {"cancelled": False, "checked_at": 0.0}
+
+        def is_cancelled() -> bool:
+            now = time.monotonic()
+            if not state["cancelled"] and now - state["checked_at"] >= self.cancel_check_interval:
+                state["checked_at"] = now
+                state["cancelled"] = bool(
+                    db_session.query(Job.cancel_requested).filter(Job.id == job_id).scalar()
+                )
+            return state["cancelled"]
+
+        return is_cancelled
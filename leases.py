@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  leases.py
+#
+
+import os
+import socket
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Iterator, List, Set
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from viaa.configuration import ConfigParser
+from viaa.observability import logging
+
+from database import db_session
+from models import MediaObject
+
+logger = logging.get_logger(config=ConfigParser())
+
+
+class LeaseManager:
+    """Hands out media objects to one worker at a time, so several processes or pods
+    can send update requests for the same database without sending an item twice.
+
+    A worker leases a batch of rows by writing its id and an expiry time on them. Rows
+    with a lease that has not expired are skipped by every other worker. The lease of
+    a row is released when its status is written, see StatusWriter. The rows of a
+    worker that died become available again when their lease expires.
+
+    While a batch is handed out, the leases of the rows the worker still holds are
+    renewed every half `lease_duration`, so a batch that is sent slowly (the rate
+    limiter slowed down, the circuit breaker is open) does not expire halfway.
+    """
+
+    def __init__(self, worker_id: str = None, lease_size: int = 500, lease_duration: float = 600):
+        self.worker_id: str = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        # stay below SQLite's limit on the number of variables in a query
+        self.lease_size: int = min(max(lease_size, 1), 500)
+        self.lease_duration: float = lease_duration
+
+    def claim(self, *criterion) -> List[MediaObject]:
+        """Leases up to `lease_size` rows matching the criteria that are not leased.
+
+        Arguments:
+            criterion -- filters for the media objects, e.g. `MediaObject.status == 0`
+
+        Returns:
+            List -- the leased media objects, detached from the session
+        """
+        while True:
+            now = datetime.now()
+            lease_until = now + timedelta(seconds=self.lease_duration)
+            available = or_(MediaObject.lease_until.is_(None), MediaObject.lease_until < now)
+            candidates: List[str] = [
+                media_id
+                for media_id, in db_session.query(MediaObject.vrt_media_id)
+                .filter(*criterion)
+                .filter(available)
+                .order_by(MediaObject.vrt_media_id)
+                .limit(self.lease_size)
+            ]
+            if not candidates:
+                return []
+
+            try:
+                # only rows that are still available get leased, another worker may
+                # have claimed some of them since they were read
+                db_session.query(MediaObject).filter(
+                    MediaObject.vrt_media_id.in_(candidates), available
+                ).update(
+                    {"leased_by": self.worker_id, "lease_until": lease_until},
+                    synchronize_session=False,
+                )
+                db_session.commit()
+            except SQLAlchemyError as exception:
+                db_session.rollback()
+                logger.warning(f"Failed to lease media objects: {exception}")
+                return []
+
+            leased: List[MediaObject] = db_session.query(MediaObject).filter(
+                MediaObject.leased_by == self.worker_id, MediaObject.lease_until == lease_until
+            ).order_by(MediaObject.vrt_media_id).all()
+            db_session.expunge_all()
+            if leased:
+                return leased
+            # every candidate was taken by another worker, try the next ones
+
+    def iter_leased(self, *criterion) -> Iterator[MediaObject]:
+        """Yields media objects matching the criteria, leasing the next batch when the
+        previous one has been handed out, until no rows are available.
+
+        Rows whose lease was lost to another worker before they were handed out are
+        skipped.
+        """
+        while True:
+            leased = self.claim(*criterion)
+            if not leased:
+                return
+            pending: Deque[MediaObject] = deque(leased)
+            renewed_at = time.monotonic()
+            while pending:
+                if time.monotonic() - renewed_at >= self.lease_duration / 2:
+                    held = self.renew([obj.vrt_media_id for obj in pending])
+                    renewed_at = time.monotonic()
+                    pending = deque(obj for obj in pending if obj.vrt_media_id in held)
+                    continue
+                yield pending.popleft()
+
+    def renew(self, media_ids: List[str]) -> Set[str]:
+        """Extends the lease of every row this worker holds, including the rows that
+        were handed out but whose status is not written yet.
+
+        Arguments:
+            media_ids {List} -- the media ids that are still to be handed out
+
+        Returns:
+            Set -- the ones among them this worker still holds, none if the leases
+            could not be renewed
+        """
+        lease_until = datetime.now() + timedelta(seconds=self.lease_duration)
+        try:
+            db_session.query(MediaObject).filter(
+                MediaObject.leased_by == self.worker_id
+            ).update({"lease_until": lease_until}, synchronize_session=False)
+            db_session.commit()
+            held: Set[str] = {
+                media_id
+                for media_id, in db_session.query(MediaObject.vrt_media_id).filter(
+                    MediaObject.leased_by == self.worker_id,
+                    MediaObject.vrt_media_id.in_(media_ids),
+                )
+            }
+            db_session.commit()
+        except SQLAlchemyError as exception:
+            db_session.rollback()
+            # the rows are handed out again by whoever leases them after they expire
+            logger.warning(f"Failed to renew the leases of {self.worker_id}: {exception}")
+            return set()
+        return held
+
+    def release(self) -> None:
+        """Releases all rows this worker still holds, e.g. after it was cancelled."""
+        try:
+            db_session.query(MediaObject).filter(
+                MediaObject.leased_by == self.worker_id
+            ).update({"leased_by": None, "lease_until": None}, synchronize_session=False)
+            db_session.commit()
+        except SQLAlchemyError as exception:
+            db_session.rollback()
+            logger.warning(f"Failed to release the leases of {self.worker_id}: {exception}")
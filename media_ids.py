@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  media_ids.py
+#
+
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy.exc import SQLAlchemyError
+from viaa.configuration import ConfigParser
+from viaa.observability import logging
+
+from database import db_session
+from models import MediaObject
+
+logger = logging.get_logger(config=ConfigParser())
+
+
+def normalize_media_id(media_id: str) -> str:
+    """Returns the form a media id is stored and sent in: without surrounding whitespace."""
+    return media_id.strip()
+
+
+def media_id_key(media_id: str, fold_case: bool = False) -> str:
+    """Returns the key duplicate media ids share: the normalized media id and, when
+    `fold_case` is True, case-folded. Only used to find duplicates, the media id itself
+    keeps its case.
+    """
+    media_id = normalize_media_id(media_id)
+    return media_id.casefold() if fold_case else media_id
+
+
+class SeenMediaIds:
+    """Thread-safe set of the media ids written during a run, so a media id that comes
+    by again (e.g. on two pages while the collection changes) is dropped before it
+    reaches the database.
+
+    At most `max_size` ids are remembered, after that new ids are let through and the
+    primary key keeps them unique. An exact set is used rather than a Bloom filter, a
+    false positive would silently drop a media id. With `fold_case`, media ids that only
+    differ in case are duplicates as well, see `media_id_key`.
+    """
+
+    def __init__(self, max_size: int = 1000000, fold_case: bool = False):
+        self.max_size: int = max_size
+        self.fold_case: bool = fold_case
+        self.media_ids: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def filter_new(self, media_ids: Iterable[str]) -> List[str]:
+        """Returns the media ids that were not seen before, in order and without
+        duplicates, and remembers them. The first one of a set of duplicates is kept.
+        """
+        new: List[str] = list()
+        new_keys: Set[str] = set()
+        with self.lock:
+            for media_id in media_ids:
+                key = media_id_key(media_id, self.fold_case)
+                if key in self.media_ids or key in new_keys:
+                    continue
+                if len(self.media_ids) < self.max_size:
+                    self.media_ids.add(key)
+                new_keys.add(key)
+                new.append(media_id)
+        return new
+
+    def clear(self) -> None:
+        """Forgets all ids, e.g. when the transaction that wrote them was rolled back."""
+        with self.lock:
+            self.media_ids.clear()
+
+
+def merge_media_objects(media_objects: List[MediaObject]) -> MediaObject:
+    """Returns the row whose state is kept when duplicate rows are merged: a successful
+    update wins, otherwise the most recently updated row.
+    """
+    return max(
+        media_objects,
+        key=lambda obj: (obj.status == 1, obj.last_update or datetime.min),
+    )
+
+
+def compact_media_ids(fold_case: bool = False, batch_size: int = 500) -> int:
+    """Merges the rows whose media ids have the same key into one row, see
+    `media_id_key` and `merge_media_objects`. The kept row gets its own normalized
+    media id, so the case of a media id is never changed.
+
+    A one-off for databases written before media ids were normalized, run it while
+    no update is running.
+
+    Keyword Arguments:
+        fold_case {bool} -- whether media ids differing in case are the same (default: {False})
+        batch_size {int} -- number of merged media ids per transaction (default: {500})
+
+    Returns:
+        int -- the number of rows that were removed or renamed
+    """
+    groups: Dict[str, List[str]] = dict()
+    for media_id, in db_session.query(MediaObject.vrt_media_id).yield_per(10000):
+        groups.setdefault(media_id_key(media_id, fold_case), list()).append(media_id)
+    db_session.commit()
+    dirty = [
+        media_ids
+        for media_ids in groups.values()
+        if len(media_ids) > 1 or media_ids[0] != normalize_media_id(media_ids[0])
+    ]
+    del groups
+    logger.info(f"Compacting {len(dirty)} media ids.")
+
+    changed = 0
+    for i in range(0, len(dirty), batch_size):
+        try:
+            for media_ids in dirty[i : i + batch_size]:
+                rows: List[MediaObject] = db_session.query(MediaObject).filter(
+                    MediaObject.vrt_media_id.in_(media_ids)
+                ).all()
+                kept = merge_media_objects(rows)
+                normalized = normalize_media_id(kept.vrt_media_id)
+                for row in rows:
+                    if row is not kept:
+                        db_session.delete(row)
+                        changed += 1
+                # the duplicates are gone before the kept row takes the normalized id
+                db_session.flush()
+                if kept.vrt_media_id != normalized:
+                    kept.vrt_media_id = normalized
+                    changed += 1
+                kept.leased_by = None
+                kept.lease_until = None
+            db_session.commit()
+        except SQLAlchemyError as exception:
+            db_session.rollback()
+            logger.warning(f"Failed to compact media ids: {exception}")
+            raise
+    logger.info(f"Compacted media ids, {changed} rows removed or renamed.")
+    return changed
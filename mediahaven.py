@@ -1,12 +1,22 @@
 import functools
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
 
-import requests
+import ijson
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from viaa.configuration import ConfigParser
 from viaa.observability import logging
 from requests.exceptions import RequestException
 
+from metrics import MEDIAHAVEN_PAGE_SECONDS, RETRIES, TOKEN_REFRESHES
+from ratelimiter import TokenBucket
+
 logger = logging.get_logger(config=ConfigParser())
 
 
@@ -15,55 +25,213 @@ class AuthenticationException(Exception):
     pass
 
 
-class MediahavenClient:
-    def __init__(self, config: dict = None):
-        self.cfg: dict = config
-        self.token_info = None
+class MediahavenException(Exception):
+    """Exception raised when MediaHaven does not return a page of fragments."""
+    pass
 
 
-    def __authenticate(function):
-        @functools.wraps(function)
-        def wrapper_authenticate(self, *args, **kwargs):
-            if not self.token_info:
-                self.token_info = self.__get_token()
-            try:
-                return function(self, *args, **kwargs)
-            except AuthenticationException as error:
-                self.token_info = self.__get_token()
-            return function(self, *args, **kwargs)
+def check_fragments(media_data: dict) -> dict:
+    """Returns the page if it has the fields the pager relies on, raises otherwise.
 
-        return wrapper_authenticate
+    A page without them must not be mistaken for the (empty) end of the results.
+    """
+    if not isinstance(media_data, dict) or "TotalNrOfResults" not in media_data:
+        raise MediahavenException(f"No TotalNrOfResults in the response: {str(media_data)[:200]}")
+    media_data.setdefault("MediaDataList", [])
+    return media_data
+
+
+def get_query(config: dict, modified_since: datetime = None) -> str:
+    """Returns the MediaHaven query for the configured media type.
+
+    Arguments:
+        config {dict} -- the configuration, with `media_type`
+
+    Keyword Arguments:
+        modified_since {datetime} -- only match fragments changed since then, in UTC (default: {None})
+    """
+    query: str = f'%2b(type_viaa:"{config["media_type"]}")'
+    if modified_since:
+        field: str = config.get("mediahaven_modified_field", "LastModifiedDate")
+        query += f' %2b({field}:[{modified_since.strftime("%Y-%m-%dT%H:%M:%SZ")} TO *])'
+    return query
+
+
+class TokenManager:
+    """Keeps the OAuth token of a MediaHaven user, shared by all clients and threads.
 
+    The token is refreshed in the background before it expires, according to the
+    `expires_in` of the token response, so requests do not wait for a new one. When
+    there is no valid token, the first caller fetches one while the others wait for
+    it, so concurrent callers cause a single request to /oauth/access_token.
+    """
 
-    def __get_token(self) -> str:
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        refresh_margin: float = 60,
+        retry_interval: float = 10,
+    ):
+        self.url: str = host + "/oauth/access_token"
+        self.username: str = username
+        self.password: str = password
+        self.refresh_margin: float = refresh_margin
+        self.retry_interval: float = retry_interval
+        self.session = Session()
+        self.lock = threading.Lock()
+        self.token_info: Optional[dict] = None
+        self.expires_at: float = 0
+        self.refresh_at: float = 0
+        self.refreshing: bool = False
+
+    def get(self) -> dict:
+        """Returns a valid token, fetching one first if there is none."""
+        with self.lock:
+            now = time.monotonic()
+            if self.token_info is not None and now < self.expires_at:
+                if now >= self.refresh_at and not self.refreshing:
+                    self.refreshing = True
+                    threading.Thread(
+                        target=self.__refresh, name="mediahaven-token", daemon=True
+                    ).start()
+                return self.token_info
+            self.__store(self.__fetch())
+            return self.token_info
+
+    def set(self, token_info: dict) -> None:
+        """Uses the given token until it expires."""
+        with self.lock:
+            self.__store(token_info)
+
+    def invalidate(self, token_info: dict) -> None:
+        """Drops a token that was refused, unless it has been replaced already."""
+        with self.lock:
+            if self.token_info is token_info:
+                self.token_info = None
+
+    def __store(self, token_info: dict) -> None:
+        now = time.monotonic()
+        expires_in: Optional[float] = token_info.get("expires_in")
+        self.token_info = token_info
+        if expires_in:
+            expires_in = float(expires_in)
+            self.expires_at = now + expires_in
+            self.refresh_at = now + max(expires_in - self.refresh_margin, expires_in / 2)
+        else:
+            # no expiry known, the token is only replaced after a 401
+            self.expires_at = self.refresh_at = float("inf")
+
+    def __refresh(self) -> None:
+        try:
+            token_info = self.__fetch()
+            with self.lock:
+                self.__store(token_info)
+        except (ConnectionError, RequestException) as exception:
+            logger.warning(f"Failed to refresh the token: {exception}")
+            with self.lock:
+                self.refresh_at = time.monotonic() + self.retry_interval
+        finally:
+            self.refreshing = False
+
+    def __fetch(self) -> dict:
         """Gets an OAuth token that can be used in mediahaven requests to authenticate."""
-        user: str = self.cfg["environment"]["mediahaven"]["username"]
-        password:str = self.cfg["environment"]["mediahaven"]["password"]
-        url: str = self.cfg["environment"]["mediahaven"]["host"] + "/oauth/access_token"
         payload = {"grant_type": "password"}
 
+        TOKEN_REFRESHES.inc()
         try:
-            r = requests.post(
-                url,
-                auth=HTTPBasicAuth(user.encode("utf-8"), password.encode("utf-8")),
+            r = self.session.post(
+                self.url,
+                auth=HTTPBasicAuth(self.username.encode("utf-8"), self.password.encode("utf-8")),
                 data=payload,
             )
 
             if r.status_code != 201:
                 raise ConnectionError(f"Failed to get a token. Status: {r.status_code}")
-            token_info =  r.json()
+            token_info = r.json()
         except ConnectionError as e:
             logger.critical(str(e))
             raise
         return token_info
 
 
+# One token per MediaHaven user for the whole process, app.py creates new clients
+# for every request
+token_managers: Dict[Tuple[str, str], TokenManager] = dict()
+token_managers_lock = threading.Lock()
+
+
+def get_token_manager(config: dict) -> TokenManager:
+    """Returns the token manager of the configured MediaHaven user."""
+    mediahaven_cfg: dict = config["environment"]["mediahaven"]
+    key = (mediahaven_cfg["host"], mediahaven_cfg.get("username"))
+    with token_managers_lock:
+        if key not in token_managers:
+            token_managers[key] = TokenManager(
+                mediahaven_cfg["host"],
+                mediahaven_cfg.get("username"),
+                mediahaven_cfg.get("password"),
+                refresh_margin=config.get("mediahaven_token_refresh_margin", 60),
+            )
+        return token_managers[key]
+
+
+class MediahavenClient:
+    def __init__(self, config: dict = None, rate_limiter: TokenBucket = None):
+        self.cfg: dict = config
+        self.rate_limiter: TokenBucket = rate_limiter or TokenBucket()
+        self.prefetch_pages: int = self.cfg.get("mediahaven_prefetch_pages", 2)
+        self.__token_manager: Optional[TokenManager] = None
+
+        # One keep-alive session, big enough for the prefetching pager or harvest workers
+        pool_size: int = max(self.prefetch_pages + 1, self.cfg.get("harvest_workers", 1))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+    @property
+    def token_manager(self) -> TokenManager:
+        if self.__token_manager is None:
+            self.__token_manager = get_token_manager(self.cfg)
+        return self.__token_manager
+
+
+    @property
+    def token_info(self) -> dict:
+        """The current token, shared with the other clients of the same user."""
+        return self.token_manager.get()
+
+
+    @token_info.setter
+    def token_info(self, token_info: dict) -> None:
+        self.token_manager.set(token_info)
+
+
+    def __authenticate(function):
+        @functools.wraps(function)
+        def wrapper_authenticate(self, *args, **kwargs):
+            token_info = self.token_info
+            try:
+                return function(self, *args, **kwargs)
+            except AuthenticationException as error:
+                RETRIES.labels("mediahaven").inc()
+                # the next request fetches a new token, unless another one already did
+                self.token_manager.invalidate(token_info)
+            return function(self, *args, **kwargs)
+
+        return wrapper_authenticate
+
+
     @__authenticate
-    def get_fragments(self, offset: int = 0) -> dict:
+    def get_fragments(self, offset: int = 0, modified_since: datetime = None) -> dict:
         """Gets the next 1000 fragments at a time for a configured media type.
 
         Keyword Arguments:
             offset {int} -- offset for paging (default: {0})
+            modified_since {datetime} -- only get fragments changed since then, in UTC (default: {None})
 
         Returns:
             dict -- contains the fragments and the total number of results
@@ -78,21 +246,117 @@ class MediahavenClient:
             }
 
         params: dict = {
-            "q": f'%2b(type_viaa:"{self.cfg["media_type"]}")',
+            "q": get_query(self.cfg, modified_since),
             "startIndex": offset,
             "nrOfResults": self.cfg["nr_of_results"],
             }
+        streaming_json: bool = self.cfg.get("mediahaven_streaming_json", False)
+        self.rate_limiter.acquire()
+        start = time.monotonic()
         try:
-            response = requests.get(
+            response = self.session.get(
                 url,
                 headers=headers,
                 params=params,
+                stream=streaming_json,
                 )
         except RequestException as e:
             logger.critical(str(e))
+            raise
 
+        self.rate_limiter.report(response.status_code)
         if response.status_code == 401:
             # AuthenticationException triggers a retry with a new token
             raise AuthenticationException(response.text)
+        if response.status_code != 200:
+            raise MediahavenException(
+                f"Failed to get fragments. Status: {response.status_code}: {response.text[:200]}"
+            )
+
+        if streaming_json:
+            media_data = self.__parse_fragments(response)
+        else:
+            media_data = check_fragments(response.json())
+        MEDIAHAVEN_PAGE_SECONDS.observe(time.monotonic() - start)
+        return media_data
+
+
+    def __parse_fragments(self, response: Response) -> dict:
+        """Reads only the fields that are used from the body while it is received.
+
+        The full fragments are never decoded, every item only keeps its
+        dc_identifier_localid, in the same structure as the response.
+        """
+        media_data: dict = {"MediaDataList": []}
+        response.raw.decode_content = True
+        try:
+            for prefix, event, value in ijson.parse(response.raw):
+                if prefix == "MediaDataList.item" and event == "start_map":
+                    item: dict = {"Dynamic": {}}
+                    media_data["MediaDataList"].append(item)
+                elif prefix == "MediaDataList.item.Dynamic.dc_identifier_localid":
+                    item["Dynamic"]["dc_identifier_localid"] = value
+                elif prefix == "TotalNrOfResults":
+                    media_data["TotalNrOfResults"] = int(value)
+        except Exception:
+            # the rest of the body is still on the connection, it cannot be reused
+            response.close()
+            raise
+        # the whole body was read, hand the connection back to the pool
+        response.raw.release_conn()
+        return check_fragments(media_data)
+
 
-        return response.json()
+    def iter_fragment_pages(
+        self, offset: int = 0, first_page: dict = None, modified_since: datetime = None
+    ) -> Iterator[dict]:
+        """Yields all pages of fragments, starting from the given offset.
+
+        Every page starts where the previous one ended, counting all items MediaHaven
+        returned, also those without a local id. While a page is being handled by the
+        caller, the next `mediahaven_prefetch_pages` pages are already fetched in the
+        background.
+
+        Keyword Arguments:
+            offset {int} -- offset of the first page (default: {0})
+            first_page {dict} -- the page at offset, if it has been fetched already
+            modified_since {datetime} -- only get fragments changed since then, in UTC
+
+        Yields:
+            dict -- the fragments of a page and the total number of results
+        """
+        fetch = functools.partial(self.get_fragments, modified_since=modified_since)
+        page = first_page if first_page is not None else fetch(offset)
+        total: int = page["TotalNrOfResults"]
+        # MediaHaven may return less than nr_of_results per page, so step by what it returns
+        step: int = len(page["MediaDataList"]) or self.cfg["nr_of_results"]
+        next_offset: int = offset + len(page["MediaDataList"])
+
+        with ThreadPoolExecutor(max_workers=max(self.prefetch_pages, 1)) as executor:
+            pending = deque()
+
+            def prefetch(depth: int) -> None:
+                planned = pending[-1][0] + step if pending else next_offset
+                while len(pending) < depth and planned < total:
+                    pending.append((planned, executor.submit(fetch, offset=planned)))
+                    planned += step
+
+            try:
+                while True:
+                    prefetch(self.prefetch_pages)
+                    yield page
+                    prefetch(1)
+                    if not pending or not page["MediaDataList"]:
+                        return
+                    page_offset, future = pending.popleft()
+                    page = future.result()
+                    next_offset = page_offset + len(page["MediaDataList"])
+                    if len(page["MediaDataList"]) < step and next_offset < total:
+                        # a short page, the offsets that were prefetched no longer line up
+                        for _, future in pending:
+                            future.cancel()
+                        pending.clear()
+            finally:
+                # Stop prefetching when the caller stops early
+                for _, future in pending:
+                    future.cancel()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  metrics.py
+#
+
+import os
+
+import prometheus_client
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+
+CONTENT_TYPE_LATEST: str = prometheus_client.CONTENT_TYPE_LATEST
+
+# Under uWSGI the run and /metrics are handled by different processes. With the
+# prometheus_multiproc_dir environment variable set, every process writes its
+# metrics to that directory and /metrics adds them up.
+MULTIPROCESS_DIR_VARIABLE = "prometheus_multiproc_dir"
+
+# Only the uWSGI entrypoint clears the directory. The batch job, `--worker` and
+# `--compact-media-ids` import this module too, and defining the metrics fails when
+# the directory does not exist.
+if os.environ.get(MULTIPROCESS_DIR_VARIABLE):
+    os.makedirs(os.environ[MULTIPROCESS_DIR_VARIABLE], exist_ok=True)
+
+MEDIAHAVEN_PAGE_SECONDS = Histogram(
+    "vrt_metadata_updater_mediahaven_page_seconds",
+    "Time to fetch and parse a page of fragments from MediaHaven.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+VRT_REQUEST_SECONDS = Histogram(
+    "vrt_metadata_updater_vrt_request_seconds",
+    "Time of an update request to the VRT request API, including its retries.",
+)
+VRT_RESPONSES = Counter(
+    "vrt_metadata_updater_vrt_responses_total",
+    "Responses of the VRT request API by status code, 'error' when there was none.",
+    ["status_code"],
+)
+RETRIES = Counter(
+    "vrt_metadata_updater_retries_total",
+    "Requests that were sent again.",
+    ["service"],
+)
+TOKEN_REFRESHES = Counter(
+    "vrt_metadata_updater_token_refreshes_total",
+    "OAuth tokens fetched from MediaHaven.",
+)
+DB_WRITE_SECONDS = Histogram(
+    "vrt_metadata_updater_db_write_seconds",
+    "Time to write a batch to the database.",
+    ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+IN_FLIGHT = Gauge(
+    "vrt_metadata_updater_vrt_requests_in_flight",
+    "Update requests to the VRT request API that have not been answered yet.",
+    multiprocess_mode="livesum",
+)
+QUEUE_DEPTH = Gauge(
+    "vrt_metadata_updater_queue_depth",
+    "Items waiting in a queue, e.g. statuses that are not written yet.",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+# the pinned prometheus-client (0.7.1) has no livemax mode, every live process
+# exposes its own value with a pid label instead
+CIRCUIT_BREAKER_STATE = Gauge(
+    "vrt_metadata_updater_circuit_breaker_state",
+    "State of the circuit breaker of a service: 0 closed, 1 half-open, 2 open.",
+    ["service"],
+    multiprocess_mode="liveall",
+)
+CONCURRENCY_LIMIT = Gauge(
+    "vrt_metadata_updater_vrt_concurrency_limit",
+    "Update requests to the VRT request API allowed in flight at the moment.",
+    multiprocess_mode="liveall",
+)
+
+
+def generate_latest() -> bytes:
+    """Returns the metrics of this process, or of all processes in multiprocess mode."""
+    if os.environ.get(MULTIPROCESS_DIR_VARIABLE):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
@@ -8,7 +8,7 @@
 
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Integer, String
 
 from database import Base
 
@@ -17,15 +17,86 @@ class MediaObject(Base):
     __tablename__ = "media_objects"
 
     vrt_media_id = Column(String, primary_key=True)
-    status = Column(Integer)
+    status = Column(Integer, index=True)
     last_update = Column(DateTime)
+    # the worker that is sending an update request for this item, until lease_until
+    leased_by = Column(String)
+    lease_until = Column(DateTime, index=True)
+    # failed update requests: status 2 is retried after next_attempt_at, status 3 is
+    # given up after `max_attempts`
+    attempts = Column(Integer)
+    last_error = Column(String)
+    next_attempt_at = Column(DateTime, index=True)
 
     def __init__(self, vrt_media_id: str) -> None:
         self.vrt_media_id = vrt_media_id
         self.status = 0
         self.last_update = datetime.now()
+        self.attempts = 0
     
     
     def get_dict(self):
         return dict((column.name, getattr(self, column.name)) for column in self.__table__.columns)
-    
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    id = Column(String, primary_key=True)
+    status = Column(String)
+    cancel_requested = Column(Boolean)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    error = Column(String)
+
+    def __init__(self, job_id: str) -> None:
+        self.id = job_id
+        self.status = Job.RUNNING
+        self.cancel_requested = False
+        self.started_at = datetime.now()
+
+
+    def get_dict(self):
+        return dict((column.name, getattr(self, column.name)) for column in self.__table__.columns)
+
+
+class HarvestState(Base):
+    __tablename__ = "harvest_state"
+
+    media_type = Column(String, primary_key=True)
+    # start of the last complete harvest in UTC, later harvests only ask MediaHaven
+    # for items that changed since then
+    watermark = Column(DateTime)
+    # where an unfinished harvest stopped, a new run with the same query resumes there
+    checkpoint_offset = Column(Integer)
+    checkpoint_modified_since = Column(DateTime)
+    checkpoint_started_at = Column(DateTime)
+
+    def __init__(self, media_type: str) -> None:
+        self.media_type = media_type
+
+
+class HarvestPartition(Base):
+    __tablename__ = "harvest_partitions"
+
+    media_type = Column(String, primary_key=True)
+    start = Column(Integer, primary_key=True)
+    end = Column(Integer)
+    # the total and query the partitions were planned for, a harvest with other
+    # values starts over
+    total = Column(Integer)
+    modified_since = Column(DateTime)
+    completed = Column(Boolean)
+
+    def __init__(self, media_type: str, start: int, end: int, total: int, modified_since: datetime = None) -> None:
+        self.media_type = media_type
+        self.start = start
+        self.end = end
+        self.total = total
+        self.modified_since = modified_since
+        self.completed = False
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  ratelimiter.py
+#
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket that limits how many requests start per second.
+
+    The bucket holds at most `burst` tokens and refills at `rate` tokens per second,
+    so the time a request takes is not added on top of the wait. A rate of 0 disables
+    limiting. When the server pushes back (429 or 5xx) the current rate is cut by
+    `slow_down_factor`, and every other response wins back a step of the configured
+    rate until it is reached again.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        burst: int = 1,
+        min_rate: float = None,
+        slow_down_factor: float = 0.5,
+        recovery_steps: int = 20,
+    ):
+        self.max_rate: float = rate
+        self.rate: float = rate
+        self.burst: int = max(burst, 1)
+        self.min_rate: float = min_rate if min_rate is not None else rate / 10
+        self.slow_down_factor: float = slow_down_factor
+        self.recovery_step: float = rate / recovery_steps
+        self.tokens: float = float(self.burst)
+        self.updated: float = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a request is allowed to start.
+
+        Returns:
+            float -- the number of seconds waited
+        """
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def reserve(self) -> float:
+        """Takes a token without blocking, for callers that wait themselves (asyncio).
+
+        Returns:
+            float -- the number of seconds to wait before the request may start
+        """
+        if not self.max_rate:
+            return 0
+        with self.lock:
+            self.__refill()
+            # Reserve the token right away, a negative balance is the queue of
+            # callers that are already waiting for a token.
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def report(self, status_code: int) -> None:
+        """Adapts the rate to the status code of a finished request."""
+        if not self.max_rate:
+            return
+        with self.lock:
+            self.__refill()
+            if status_code == 429 or status_code >= 500:
+                self.rate = max(self.min_rate, self.rate * self.slow_down_factor)
+            elif self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class ConcurrencyLimit:
+    """Thread-safe limit on the number of requests in flight that follows the server.
+
+    The limit starts at `limit`. When the server pushes back (no response, 429 or 5xx)
+    it is cut by `decrease_factor`, down to `min_limit`, and every other response adds
+    1 / limit, so it grows by about one per round of requests until `limit` is reached
+    again (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, limit: int = 1, min_limit: int = 1, decrease_factor: float = 0.5):
+        self.max_limit: int = max(limit, 1)
+        self.min_limit: int = min(max(min_limit, 1), self.max_limit)
+        self.decrease_factor: float = decrease_factor
+        self.current: float = float(self.max_limit)
+        self.lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        """The number of requests that may be in flight now."""
+        return int(self.current)
+
+    def report(self, status_code: Optional[int]) -> None:
+        """Adapts the limit to the status code of a finished request, None when there
+        was no response.
+        """
+        with self.lock:
+            if status_code is None or status_code == 429 or status_code >= 500:
+                self.current = max(self.min_limit, self.current * self.decrease_factor)
+            elif self.current < self.max_limit:
+                self.current = min(self.max_limit, self.current + 1 / self.current)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  status_writer.py
+#
+
+import time
+from typing import List
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from viaa.configuration import ConfigParser
+from viaa.observability import logging
+
+from database import db_session
+from metrics import DB_WRITE_SECONDS, QUEUE_DEPTH
+from models import MediaObject
+
+logger = logging.get_logger(config=ConfigParser())
+
+table = MediaObject.__table__
+update_status_statement = (
+    table.update()
+    .where(table.c.vrt_media_id == bindparam("media_id"))
+    .values(
+        status=bindparam("new_status"),
+        last_update=bindparam("updated_at"),
+        attempts=bindparam("attempts"),
+        last_error=bindparam("last_error"),
+        next_attempt_at=bindparam("next_attempt_at"),
+        # a written status ends the lease of a worker on the row
+        leased_by=None,
+        lease_until=None,
+    )
+)
+
+
+class StatusWriter:
+    """Buffers status updates and writes them in one transaction per batch.
+
+    A batch is written every `batch_size` updates or after `flush_interval` seconds,
+    whichever comes first. Updates that were not written yet are lost when the
+    process dies, those media objects keep their old status and are sent again on
+    the next run.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 5):
+        self.batch_size: int = max(batch_size, 1)
+        self.flush_interval: float = flush_interval
+        self.buffer: List[dict] = list()
+        self.last_flush: float = time.monotonic()
+
+    def add(self, media_object: MediaObject) -> None:
+        """Buffers the current status of a media object."""
+        self.buffer.append(
+            {
+                "media_id": media_object.vrt_media_id,
+                "new_status": media_object.status,
+                "updated_at": media_object.last_update,
+                "attempts": media_object.attempts,
+                "last_error": media_object.last_error,
+                "next_attempt_at": media_object.next_attempt_at,
+            }
+        )
+        QUEUE_DEPTH.labels("status_writer").set(len(self.buffer))
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all buffered status updates with a single executemany."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, list()
+        QUEUE_DEPTH.labels("status_writer").set(0)
+        try:
+            with DB_WRITE_SECONDS.labels("statuses").time():
+                db_session.execute(update_status_statement, batch)
+                db_session.commit()
+        except SQLAlchemyError as exception:
+            db_session.rollback()
+            logger.warning(f"Failed to update the status of {len(batch)} media objects.")
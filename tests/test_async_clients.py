@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_async_clients.py
+#
+
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import web
+
+from async_clients import AsyncMediahavenClient, AsyncVrtRequestApiClient
+from circuitbreaker import OPEN, CircuitBreaker
+from mediahaven import MediahavenException
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+total_nr_of_results = 25
+
+
+async def serve(routes: list, test) -> None:
+    """Runs the coroutine function `test` with the url of a local server for the routes."""
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        await test(f"http://127.0.0.1:{port}")
+    finally:
+        await runner.cleanup()
+
+
+class TestAsyncMediahavenClient(unittest.TestCase):
+    def test_iter_fragment_pages(self):
+        # Arrange
+        calls = {"token": 0, "media": 0}
+
+        async def token(request):
+            calls["token"] += 1
+            return web.json_response({"access_token": "token"}, status=201)
+
+        async def media(request):
+            calls["media"] += 1
+            if calls["media"] == 1:
+                # the first token has expired
+                return web.Response(status=401)
+            offset = int(request.query["startIndex"])
+            ids = range(offset, min(offset + 10, total_nr_of_results))
+            return web.json_response({
+                "TotalNrOfResults": total_nr_of_results,
+                "MediaDataList": [{"Dynamic": {"dc_identifier_localid": str(i)}} for i in ids],
+            })
+
+        pages = []
+
+        async def test(url):
+            config = {
+                "environment": {"mediahaven": {"host": url, "username": "u", "password": "p"}},
+                "media_type": "audio",
+                "nr_of_results": 10,
+            }
+            async with AsyncMediahavenClient(config) as client:
+                async for page in client.iter_fragment_pages():
+                    pages.append(page)
+
+        # Act
+        asyncio.run(serve([web.post("/oauth/access_token", token), web.get("/media/", media)], test))
+
+        # Assert
+        assert calls["token"] == 2
+        ids = [item["Dynamic"]["dc_identifier_localid"] for page in pages for item in page["MediaDataList"]]
+        assert ids == [str(i) for i in range(total_nr_of_results)]
+
+
+    def test_error_status_is_not_an_empty_page(self):
+        # Arrange
+        async def token(request):
+            return web.json_response({"access_token": "token"}, status=201)
+
+        async def media(request):
+            return web.json_response({"status": 503, "message": "unavailable"}, status=503)
+
+        async def test(url):
+            config = {
+                "environment": {"mediahaven": {"host": url, "username": "u", "password": "p"}},
+                "media_type": "audio",
+                "nr_of_results": 10,
+            }
+            async with AsyncMediahavenClient(config) as client:
+                await client.get_fragments()
+
+        # Act & Assert
+        with self.assertRaises(MediahavenException):
+            asyncio.run(serve([web.post("/oauth/access_token", token), web.get("/media/", media)], test))
+
+
+class TestAsyncVrtRequestApiClient(unittest.TestCase):
+    def test_post_update_request_retries(self):
+        # Arrange
+        calls = []
+
+        async def update(request):
+            calls.append(await request.json())
+            if len(calls) < 3:
+                return web.Response(status=503, text="unavailable")
+            return web.json_response({"status": "OK"})
+
+        responses = []
+
+        async def test(url):
+            config = {
+                "environment": {
+                    "vrt_request_api": {"host": url + "/update", "retries": 3, "backoff_factor": 0}
+                },
+            }
+            async with AsyncVrtRequestApiClient(config) as client:
+                responses.append(await client.post_update_request({"media_id": "1"}))
+
+        # Act
+        asyncio.run(serve([web.post("/update", update)], test))
+
+        # Assert
+        assert len(calls) == 3
+        assert responses == [(200, {"status": "OK"})]
+
+
+    def test_post_update_request_gives_up(self):
+        # Arrange
+        async def update(request):
+            return web.Response(status=503, text="unavailable")
+
+        responses = []
+
+        async def test(url):
+            config = {
+                "environment": {
+                    "vrt_request_api": {"host": url + "/update", "retries": 1, "backoff_factor": 0}
+                },
+            }
+            async with AsyncVrtRequestApiClient(config) as client:
+                responses.append(await client.post_update_request({"media_id": "1"}))
+
+        # Act
+        asyncio.run(serve([web.post("/update", update)], test))
+
+        # Assert
+        assert responses == [(503, None)]
+
+
+
+    def test_post_update_request_circuit_breaker_opens_during_retries(self):
+        # Arrange
+        calls = []
+
+        async def update(request):
+            calls.append(await request.json())
+            return web.Response(status=503, text="unavailable")
+
+        responses = []
+        circuit_breaker = CircuitBreaker(error_rate=1, window=3)
+
+        async def test(url):
+            config = {
+                "environment": {
+                    "vrt_request_api": {"host": url + "/update", "retries": 10, "backoff_factor": 0}
+                },
+            }
+            async with AsyncVrtRequestApiClient(config, circuit_breaker) as client:
+                responses.append(await client.post_update_request({"media_id": "1"}))
+
+        # Act
+        asyncio.run(serve([web.post("/update", update)], test))
+
+        # Assert: given up after the window instead of after 11 attempts
+        assert len(calls) == 3
+        assert responses == [(503, None)]
+        assert circuit_breaker.state == OPEN
+
+
+if __name__ == "__main__":
+    unittest.main()
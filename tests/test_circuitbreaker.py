@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_circuitbreaker.py
+#
+
+import os
+import sys
+import time
+import unittest
+
+from circuitbreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_disabled(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=0, window=2)
+
+        # Act
+        for _ in range(10):
+            breaker.report(503)
+
+        # Assert
+        assert breaker.state == CLOSED
+        assert breaker.reserve() == 0
+
+
+    def test_opens_at_error_rate(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=0.5, window=4, open_duration=10)
+
+        # Act
+        breaker.report(200)
+        breaker.report(200)
+        breaker.report(503)
+        still_closed = breaker.state
+        breaker.report(None)
+
+        # Assert
+        assert still_closed == CLOSED
+        assert breaker.state == OPEN
+        assert 9 < breaker.reserve() <= 10
+
+
+    def test_client_errors_do_not_open(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=0.5, window=4)
+
+        # Act
+        for _ in range(8):
+            breaker.report(400)
+
+        # Assert
+        assert breaker.state == CLOSED
+
+
+    def test_half_open_lets_one_probe_through(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=0.5, window=2, open_duration=0.05, poll_interval=0.01)
+        breaker.report(503)
+        breaker.report(503)
+        time.sleep(0.06)
+
+        # Act
+        probe = breaker.reserve()
+        others = [breaker.reserve() for _ in range(3)]
+
+        # Assert
+        assert breaker.state == HALF_OPEN
+        assert probe == 0
+        assert others == [0.01] * 3
+
+
+    def test_probe_closes_or_reopens(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=0.5, window=2, open_duration=0.05)
+        breaker.report(503)
+        breaker.report(503)
+        time.sleep(0.06)
+
+        # Act
+        breaker.reserve()
+        breaker.report(503)
+        reopened = breaker.state
+        time.sleep(0.06)
+        breaker.reserve()
+        breaker.report(200)
+
+        # Assert
+        assert reopened == OPEN
+        assert breaker.state == CLOSED
+        assert breaker.reserve() == 0
+
+
+    def test_acquire_waits_while_open(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=1, window=1, open_duration=0.1)
+        breaker.report(503)
+
+        # Act
+        start = time.monotonic()
+        breaker.acquire()
+
+        # Assert
+        assert time.monotonic() - start >= 0.09
+        assert breaker.state == HALF_OPEN
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_dispatcher.py
+#
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+from circuitbreaker import CircuitBreaker
+from dispatcher import Dispatcher, batched
+from ratelimiter import ConcurrencyLimit, TokenBucket
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestDispatcher(unittest.TestCase):
+    def test_dispatch_all_items(self):
+        # Arrange
+        results = dict()
+        dispatcher = Dispatcher(lambda item: item % 2 == 0, concurrency=4)
+
+        # Act
+        dispatcher.dispatch(range(10), lambda item, success: results.update({item: success}))
+
+        # Assert
+        assert results == {item: item % 2 == 0 for item in range(10)}
+
+
+    def test_dispatch_respects_concurrency(self):
+        # Arrange
+        lock = threading.Lock()
+        in_flight = [0]
+        max_in_flight = [0]
+
+        def send(item):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return True
+
+        dispatcher = Dispatcher(send, concurrency=3)
+
+        # Act
+        dispatcher.dispatch(range(20), lambda item, success: None)
+
+        # Assert
+        assert max_in_flight[0] == 3
+
+
+    def test_dispatch_respects_rate(self):
+        # Arrange
+        dispatcher = Dispatcher(lambda item: True, concurrency=5, rate_limiter=TokenBucket(100))
+
+        # Act
+        start = time.monotonic()
+        dispatcher.dispatch(range(21), lambda item, success: None)
+        duration = time.monotonic() - start
+
+        # Assert
+        assert duration >= 0.2
+
+
+    def test_results_reported_in_calling_thread(self):
+        # Arrange
+        threads = set()
+        dispatcher = Dispatcher(lambda item: True, concurrency=4)
+
+        # Act
+        dispatcher.dispatch(range(10), lambda item, success: threads.add(threading.get_ident()))
+
+        # Assert
+        assert threads == {threading.get_ident()}
+
+
+    def test_dispatch_batches(self):
+        # Arrange
+        results = dict()
+        dispatcher = Dispatcher(lambda batch: {item: True for item in batch}, concurrency=2)
+
+        # Act
+        dispatcher.dispatch(batched(range(7), 3), lambda batch, result: results.update(result))
+
+        # Assert
+        assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert results == {item: True for item in range(7)}
+
+
+
+    def test_dispatch_follows_concurrency_limit(self):
+        # Arrange
+        lock = threading.Lock()
+        in_flight = [0]
+        max_in_flight = []
+        limit = ConcurrencyLimit(limit=4, min_limit=1)
+        limit.report(503)
+        limit.report(503)
+
+        def send(item):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight.append(in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return True
+
+        dispatcher = Dispatcher(send, concurrency_limit=limit)
+
+        # Act
+        dispatcher.dispatch(range(10), lambda item, success: None)
+
+        # Assert
+        assert dispatcher.concurrency == 4
+        assert max(max_in_flight) == 1
+
+
+    def test_dispatch_pauses_while_circuit_is_open(self):
+        # Arrange
+        breaker = CircuitBreaker(error_rate=1, window=1, open_duration=0.1)
+        sent = []
+
+        def send(item):
+            sent.append(time.monotonic())
+            breaker.report(503 if item == 0 else 200)
+            return True
+
+        dispatcher = Dispatcher(send, concurrency=1, circuit_breaker=breaker)
+
+        # Act
+        dispatcher.dispatch(range(3), lambda item, success: None)
+
+        # Assert
+        assert sent[1] - sent[0] >= 0.09
+        assert sent[2] - sent[1] < 0.05
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_harvester.py
+#
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from harvester import PartitionedHarvester
+from models import HarvestPartition
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def mediahaven_client(total: int, page_size: int = 10) -> MagicMock:
+    """Returns a client whose pages hold at most `page_size` of `total` items."""
+    def get_fragments(offset: int = 0, modified_since=None) -> dict:
+        ids = range(offset, min(offset + page_size, total))
+        return {
+            "TotalNrOfResults": total,
+            "MediaDataList": [{"Dynamic": {"dc_identifier_localid": str(i)}} for i in ids],
+        }
+
+    client = MagicMock()
+    client.get_fragments.side_effect = get_fragments
+    return client
+
+
+class TestPartitionedHarvester(unittest.TestCase):
+    def test_harvest_all_partitions(self):
+        # Arrange
+        client = mediahaven_client(45)
+        write_page = MagicMock(return_value=True)
+
+        # Act
+        with patch("harvester.db_session") as session:
+            session.query.return_value.filter.return_value.all.return_value = []
+            harvester = PartitionedHarvester(
+                client, write_page, workers=3, partition_pages=2, page_size=10
+            )
+            completed = harvester.harvest("audio", 45)
+
+        # Assert
+        offsets = sorted(call[1]["offset"] for call in client.get_fragments.call_args_list)
+        assert completed
+        assert offsets == [0, 10, 20, 30, 40]
+        assert write_page.call_count == 5
+
+
+    def test_resume_missing_partitions(self):
+        # Arrange
+        client = mediahaven_client(45)
+        partitions = [HarvestPartition("audio", 0, 20, 45), HarvestPartition("audio", 20, 40, 45), HarvestPartition("audio", 40, 45, 45)]
+        partitions[0].completed = True
+        partitions[2].completed = True
+
+        # Act
+        with patch("harvester.db_session") as session:
+            session.query.return_value.filter.return_value.all.return_value = partitions
+            harvester = PartitionedHarvester(
+                client, lambda media_data: True, workers=2, partition_pages=2, page_size=10
+            )
+            completed = harvester.harvest("audio", 45)
+
+        # Assert
+        offsets = sorted(call[1]["offset"] for call in client.get_fragments.call_args_list)
+        assert completed
+        assert offsets == [20, 30]
+
+
+    def test_failed_write_leaves_partition_open(self):
+        # Act
+        with patch("harvester.db_session") as session:
+            session.query.return_value.filter.return_value.all.return_value = []
+            harvester = PartitionedHarvester(
+                mediahaven_client(20), lambda media_data: False, workers=2, partition_pages=1, page_size=10
+            )
+            completed = harvester.harvest("audio", 20)
+
+        # Assert
+        assert not completed
+        session.query.return_value.filter.return_value.update.assert_not_called()
+
+
+
+    def test_short_pages(self):
+        # Arrange
+        client = mediahaven_client(45, page_size=4)
+
+        # Act
+        with patch("harvester.db_session") as session:
+            session.query.return_value.filter.return_value.all.return_value = []
+            harvester = PartitionedHarvester(
+                client, lambda media_data: True, workers=2, partition_pages=2, page_size=10
+            )
+            completed = harvester.harvest("audio", 45)
+
+        # Assert
+        offsets = sorted(call[1]["offset"] for call in client.get_fragments.call_args_list)
+        assert completed
+        assert offsets == [0, 4, 8, 12, 16, 20, 24, 28, 32, 36, 40, 44]
+
+
+    def test_empty_page_leaves_partition_open(self):
+        # Arrange
+        client = mediahaven_client(15)
+
+        # Act
+        with patch("harvester.db_session") as session:
+            session.query.return_value.filter.return_value.all.return_value = []
+            harvester = PartitionedHarvester(
+                client, lambda media_data: True, workers=1, partition_pages=2, page_size=10
+            )
+            completed = harvester.harvest("audio", 20)
+
+        # Assert
+        assert not completed
+        session.query.return_value.filter.return_value.update.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_jobs.py
+#
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from jobs import JobAlreadyRunningException, JobRunner
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def wait_for_jobs() -> None:
+    """Lets the job threads finish while the database session is still patched."""
+    for thread in threading.enumerate():
+        if thread.name.startswith("job-"):
+            thread.join(1)
+
+
+class TestJobRunner(unittest.TestCase):
+    def setUp(self):
+        self.lock_file = os.path.join(tempfile.mkdtemp(), "database.db.lock")
+
+
+    def test_start_returns_job_id(self):
+        # Arrange
+        finished = threading.Event()
+
+        # Act
+        with patch("jobs.db_session"):
+            job_runner = JobRunner(self.lock_file)
+            job_id = job_runner.start(lambda is_cancelled: finished.set())
+            finished.wait(1)
+            wait_for_jobs()
+
+        # Assert
+        assert finished.is_set()
+        assert len(job_id) == 32
+
+
+    def test_single_flight(self):
+        # Arrange
+        release = threading.Event()
+
+        with patch("jobs.db_session"):
+            job_runner = JobRunner(self.lock_file)
+            job_runner.start(lambda is_cancelled: release.wait(1))
+
+            # Act & Assert
+            with self.assertRaises(JobAlreadyRunningException):
+                job_runner.start(lambda is_cancelled: None)
+            release.set()
+            wait_for_jobs()
+
+
+    def test_cancel_flag_is_passed_to_run(self):
+        # Arrange
+        seen = []
+        finished = threading.Event()
+
+        def run(is_cancelled):
+            seen.append(is_cancelled())
+            finished.set()
+
+        # Act
+        with patch("jobs.db_session") as session:
+            session.query.return_value.filter.return_value.scalar.return_value = True
+            job_runner = JobRunner(self.lock_file)
+            job_runner.start(run)
+            finished.wait(1)
+            wait_for_jobs()
+
+        # Assert
+        assert seen == [True]
+
+
+if __name__ == "__main__":
+    unittest.main()
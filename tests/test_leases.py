@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_leases.py
+#
+
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from database import Base
+from leases import LeaseManager
+from models import MediaObject
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestLeaseManager(unittest.TestCase):
+    def setUp(self):
+        # DATABASE_URL runs these against another database, e.g. PostgreSQL
+        engine = create_engine(os.environ.get("DATABASE_URL") or "sqlite://")
+        Base.metadata.drop_all(bind=engine, tables=[MediaObject.__table__])
+        Base.metadata.create_all(bind=engine, tables=[MediaObject.__table__])
+        self.session = scoped_session(sessionmaker(bind=engine))
+        self.session.add_all(MediaObject(f"test{i}") for i in range(5))
+        self.session.commit()
+        self.addCleanup(engine.dispose)
+        self.addCleanup(self.session.remove)
+        patcher = patch("leases.db_session", self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_workers_do_not_share_rows(self):
+        # Arrange
+        worker_1 = LeaseManager("worker-1", lease_size=3)
+        worker_2 = LeaseManager("worker-2", lease_size=3)
+
+        # Act
+        leased_1 = worker_1.claim(MediaObject.status == 0)
+        leased_2 = worker_2.claim(MediaObject.status == 0)
+        leased_3 = worker_2.claim(MediaObject.status == 0)
+
+        # Assert
+        assert [obj.vrt_media_id for obj in leased_1] == ["test0", "test1", "test2"]
+        assert [obj.vrt_media_id for obj in leased_2] == ["test3", "test4"]
+        assert leased_3 == []
+
+
+    def test_expired_lease_is_reclaimed(self):
+        # Arrange
+        LeaseManager("worker-1").claim()
+        self.session.query(MediaObject).filter(MediaObject.vrt_media_id == "test0").update(
+            {"lease_until": datetime.now() - timedelta(seconds=1)}
+        )
+        self.session.commit()
+
+        # Act
+        leased = LeaseManager("worker-2").claim()
+
+        # Assert
+        assert [obj.vrt_media_id for obj in leased] == ["test0"]
+        assert leased[0].leased_by == "worker-2"
+
+
+    def test_release(self):
+        # Arrange
+        worker = LeaseManager("worker-1", lease_size=2)
+        worker.claim()
+
+        # Act
+        worker.release()
+
+        # Assert
+        assert self.session.query(MediaObject).filter(MediaObject.leased_by.isnot(None)).count() == 0
+        assert len(list(LeaseManager("worker-2").iter_leased())) == 5
+
+
+
+    def test_leases_are_renewed_while_handed_out(self):
+        # Arrange
+        worker = LeaseManager("worker-1", lease_size=5, lease_duration=0.2)
+        leased = worker.iter_leased()
+        handed_out = [next(leased).vrt_media_id]
+
+        # Act
+        time.sleep(0.15)
+        handed_out.append(next(leased).vrt_media_id)
+        time.sleep(0.1)
+        reclaimed = LeaseManager("worker-2").claim()
+
+        # Assert
+        assert handed_out == ["test0", "test1"]
+        assert reclaimed == []
+
+
+    def test_rows_lost_to_another_worker_are_skipped(self):
+        # Arrange
+        worker = LeaseManager("worker-1", lease_size=5, lease_duration=0.1)
+        leased = worker.iter_leased()
+        first = next(leased).vrt_media_id
+        self.session.query(MediaObject).filter(MediaObject.vrt_media_id == "test3").update(
+            {"leased_by": "worker-2"}
+        )
+        self.session.commit()
+
+        # Act
+        time.sleep(0.06)
+        rest = [obj.vrt_media_id for obj in leased]
+
+        # Assert
+        assert first == "test0"
+        assert rest == ["test1", "test2", "test4"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_media_ids.py
+#
+
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from database import Base
+from media_ids import SeenMediaIds, compact_media_ids, media_id_key, normalize_media_id
+from models import MediaObject
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestNormalizeMediaId(unittest.TestCase):
+    def test_normalize(self):
+        # Act & Assert
+        assert normalize_media_id("  Test1\n") == "Test1"
+
+
+    def test_media_id_key(self):
+        # Act & Assert
+        assert media_id_key("  Test1\n") == "Test1"
+        assert media_id_key("  Test1\n", fold_case=True) == "test1"
+
+
+class TestSeenMediaIds(unittest.TestCase):
+    def test_filter_new(self):
+        # Arrange
+        seen = SeenMediaIds()
+
+        # Act
+        first = seen.filter_new(["test1", "test2", "test1"])
+        second = seen.filter_new(["test2", "test3"])
+
+        # Assert
+        assert first == ["test1", "test2"]
+        assert second == ["test3"]
+
+
+    def test_lets_new_ids_through_when_full(self):
+        # Arrange
+        seen = SeenMediaIds(max_size=1)
+
+        # Act
+        first = seen.filter_new(["test1", "test2", "test2"])
+        second = seen.filter_new(["test1", "test2"])
+
+        # Assert
+        assert first == ["test1", "test2"]
+        assert second == ["test2"]
+
+
+    def test_fold_case_keeps_first_id(self):
+        # Arrange
+        seen = SeenMediaIds(fold_case=True)
+
+        # Act
+        first = seen.filter_new(["Test1", "test1", "test2"])
+        second = seen.filter_new(["TEST2", "test3"])
+
+        # Assert
+        assert first == ["Test1", "test2"]
+        assert second == ["test3"]
+
+
+class TestCompactMediaIds(unittest.TestCase):
+    def setUp(self):
+        # DATABASE_URL runs these against another database, e.g. PostgreSQL
+        engine = create_engine(os.environ.get("DATABASE_URL") or "sqlite://")
+        Base.metadata.drop_all(bind=engine, tables=[MediaObject.__table__])
+        Base.metadata.create_all(bind=engine, tables=[MediaObject.__table__])
+        self.session = scoped_session(sessionmaker(bind=engine))
+        self.addCleanup(engine.dispose)
+        self.addCleanup(self.session.remove)
+        patcher = patch("media_ids.db_session", self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def add(self, media_id: str, status: int, last_update: datetime) -> None:
+        obj = MediaObject(media_id)
+        obj.status = status
+        obj.last_update = last_update
+        self.session.add(obj)
+
+
+    def test_compact(self):
+        # Arrange
+        self.add("test1", 0, datetime(2020, 1, 3))
+        self.add(" test1", 1, datetime(2020, 1, 1))
+        self.add("Test2 ", 2, datetime(2020, 1, 2))
+        self.add("test2", 0, datetime(2020, 1, 1))
+        self.add("test3", 0, datetime(2020, 1, 1))
+        self.session.commit()
+
+        # Act
+        changed = compact_media_ids(batch_size=2)
+
+        # Assert: media ids differing in case are kept apart
+        rows = {obj.vrt_media_id: obj.status for obj in self.session.query(MediaObject)}
+        assert rows == {"test1": 1, "Test2": 2, "test2": 0, "test3": 0}
+        assert changed == 3
+
+
+    def test_compact_fold_case_keeps_case_of_kept_row(self):
+        # Arrange
+        self.add("TEST2 ", 2, datetime(2020, 1, 2))
+        self.add("test2", 0, datetime(2020, 1, 1))
+        self.add("Test3", 0, datetime(2020, 1, 1))
+        self.session.commit()
+
+        # Act
+        changed = compact_media_ids(fold_case=True)
+
+        # Assert
+        rows = {obj.vrt_media_id: obj.status for obj in self.session.query(MediaObject)}
+        assert rows == {"TEST2": 2, "Test3": 0}
+        assert changed == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_mediahaven.py
+#
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import ijson
+from urllib3.response import HTTPResponse
+
+from mediahaven import MediahavenClient, MediahavenException, TokenManager, get_token_manager
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+total_nr_of_results = 25
+
+
+def get_fragments(offset: int = 0, modified_since=None) -> dict:
+    ids = range(offset, min(offset + 10, total_nr_of_results))
+    return {
+        "TotalNrOfResults": total_nr_of_results,
+        "MediaDataList": [{"Dynamic": {"dc_identifier_localid": str(i)}} for i in ids],
+    }
+
+
+class TestMediahavenClient(unittest.TestCase):
+    def test_iter_fragment_pages(self):
+        # Arrange
+        client = MediahavenClient({"nr_of_results": 10, "mediahaven_prefetch_pages": 2})
+
+        # Act
+        with patch.object(client, "get_fragments", side_effect=get_fragments) as mock_get:
+            pages = list(client.iter_fragment_pages())
+
+        # Assert
+        assert mock_get.call_count == 3
+        ids = [item["Dynamic"]["dc_identifier_localid"] for page in pages for item in page["MediaDataList"]]
+        assert ids == [str(i) for i in range(total_nr_of_results)]
+
+
+    def test_iter_fragment_pages_without_prefetch(self):
+        # Arrange
+        client = MediahavenClient({"nr_of_results": 10, "mediahaven_prefetch_pages": 0})
+
+        # Act
+        with patch.object(client, "get_fragments", side_effect=get_fragments) as mock_get:
+            pages = list(client.iter_fragment_pages(first_page=get_fragments(0)))
+
+        # Assert
+        assert mock_get.call_count == 2
+        assert len(pages) == 3
+
+
+    def test_iter_fragment_pages_stop_early(self):
+        # Arrange
+        client = MediahavenClient({"nr_of_results": 10, "mediahaven_prefetch_pages": 1})
+
+        # Act
+        with patch.object(client, "get_fragments", side_effect=get_fragments):
+            pages = client.iter_fragment_pages()
+            first_page = next(pages)
+            pages.close()
+
+        # Assert
+        assert len(first_page["MediaDataList"]) == 10
+
+
+    def test_iter_fragment_pages_short_page(self):
+        # Arrange
+        client = MediahavenClient({"nr_of_results": 10, "mediahaven_prefetch_pages": 2})
+
+        def get_short_fragments(offset: int = 0, modified_since=None) -> dict:
+            page = get_fragments(offset)
+            if offset == 10:
+                page["MediaDataList"] = page["MediaDataList"][:6]
+            return page
+
+        # Act
+        with patch.object(client, "get_fragments", side_effect=get_short_fragments):
+            pages = list(client.iter_fragment_pages())
+
+        # Assert
+        ids = [item["Dynamic"]["dc_identifier_localid"] for page in pages for item in page["MediaDataList"]]
+        assert ids == [str(i) for i in range(total_nr_of_results)]
+
+
+    def test_modified_since_query(self):
+        # Arrange
+        client = MediahavenClient({
+            "environment": {"mediahaven": {"host": "http://0.0.0.0"}},
+            "media_type": "audio",
+            "nr_of_results": 10,
+        })
+        client.token_info = {"access_token": "token"}
+
+        # Act
+        with patch.object(client.session, "get") as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.json.return_value = {"TotalNrOfResults": 0, "MediaDataList": []}
+            client.get_fragments(modified_since=datetime(2020, 1, 2, 3, 4, 5))
+
+        # Assert
+        query = mock_get.call_args[1]["params"]["q"]
+        assert query == '%2b(type_viaa:"audio") %2b(LastModifiedDate:[2020-01-02T03:04:05Z TO *])'
+
+
+    def test_get_fragments_streaming_json(self):
+        # Arrange
+        client = MediahavenClient({
+            "environment": {"mediahaven": {"host": "http://0.0.0.0"}},
+            "media_type": "audio",
+            "nr_of_results": 10,
+            "mediahaven_streaming_json": True,
+        })
+        client.token_info = {"access_token": "token"}
+        body = json.dumps({
+            "TotalNrOfResults": 2,
+            "MediaDataList": [
+                {"Dynamic": {"dc_identifier_localid": "test1", "dc_title": "title"}},
+                {"Dynamic": {"dc_title": "no local id"}},
+            ],
+        }).encode("utf-8")
+
+        # Act
+        with patch.object(client.session, "get") as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.raw = HTTPResponse(body=io.BytesIO(body), preload_content=False)
+            media_data = client.get_fragments()
+
+        # Assert
+        assert mock_get.call_args[1]["stream"] is True
+        assert media_data == {
+            "TotalNrOfResults": 2,
+            "MediaDataList": [{"Dynamic": {"dc_identifier_localid": "test1"}}, {"Dynamic": {}}],
+        }
+
+
+    def test_get_fragments_error_status(self):
+        # Arrange
+        client = MediahavenClient({
+            "environment": {"mediahaven": {"host": "http://0.0.0.0"}},
+            "media_type": "audio",
+            "nr_of_results": 10,
+            "mediahaven_streaming_json": True,
+        })
+        client.token_info = {"access_token": "token"}
+        body = json.dumps({"status": 503, "message": "unavailable"}).encode("utf-8")
+
+        # Act & Assert
+        with patch.object(client.session, "get") as mock_get:
+            mock_get.return_value.status_code = 503
+            mock_get.return_value.text = body.decode("utf-8")
+            with self.assertRaises(MediahavenException):
+                client.get_fragments()
+
+
+    def test_get_fragments_without_total(self):
+        # Arrange
+        client = MediahavenClient({
+            "environment": {"mediahaven": {"host": "http://0.0.0.0"}},
+            "media_type": "audio",
+            "nr_of_results": 10,
+            "mediahaven_streaming_json": True,
+        })
+        client.token_info = {"access_token": "token"}
+        body = json.dumps({"status": 200, "message": "no results field"}).encode("utf-8")
+
+        # Act & Assert
+        with patch.object(client.session, "get") as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.raw = HTTPResponse(body=io.BytesIO(body), preload_content=False)
+            with self.assertRaises(MediahavenException):
+                client.get_fragments()
+
+
+    def test_get_fragments_truncated_body_closes_connection(self):
+        # Arrange
+        client = MediahavenClient({
+            "environment": {"mediahaven": {"host": "http://0.0.0.0"}},
+            "media_type": "audio",
+            "nr_of_results": 10,
+            "mediahaven_streaming_json": True,
+        })
+        client.token_info = {"access_token": "token"}
+        body = json.dumps({
+            "TotalNrOfResults": 2,
+            "MediaDataList": [{"Dynamic": {"dc_identifier_localid": "test1"}}],
+        }).encode("utf-8")[:40]
+
+        # Act
+        with patch.object(client.session, "get") as mock_get:
+            response = mock_get.return_value
+            response.status_code = 200
+            response.raw = Mock(wraps=HTTPResponse(body=io.BytesIO(body), preload_content=False))
+            with self.assertRaises(ijson.IncompleteJSONError):
+                client.get_fragments()
+
+        # Assert
+        response.close.assert_called_once()
+        response.raw.release_conn.assert_not_called()
+
+
+class TestTokenManager(unittest.TestCase):
+    def token_response(self, expires_in=None):
+        response = Mock(status_code=201)
+        self.fetched = getattr(self, "fetched", 0) + 1
+        response.json.return_value = {"access_token": f"token{self.fetched}", "expires_in": expires_in}
+        return response
+
+
+    def test_token_is_reused_until_refresh(self):
+        # Arrange
+        manager = TokenManager("http://0.0.0.0", "user", "password", refresh_margin=60)
+
+        # Act
+        with patch.object(manager.session, "post", side_effect=lambda *a, **k: self.token_response(3600)) as mock_post:
+            tokens = [manager.get()["access_token"] for _ in range(3)]
+
+        # Assert
+        assert tokens == ["token1"] * 3
+        assert mock_post.call_count == 1
+
+
+    def test_refresh_before_expiry(self):
+        # Arrange
+        manager = TokenManager("http://0.0.0.0", "user", "password", refresh_margin=60)
+        manager.set({"access_token": "old", "expires_in": 3600})
+        manager.refresh_at = time.monotonic()
+
+        # Act
+        with patch.object(manager.session, "post", side_effect=lambda *a, **k: self.token_response(3600)):
+            # the old token is still valid and returned, a new one is fetched in the background
+            first = manager.get()["access_token"]
+            for _ in range(100):
+                if not manager.refreshing:
+                    break
+                time.sleep(0.01)
+            second = manager.get()["access_token"]
+
+        # Assert
+        assert first == "old"
+        assert second == "token1"
+
+
+    def test_concurrent_fetches_collapse(self):
+        # Arrange
+        manager = TokenManager("http://0.0.0.0", "user", "password")
+
+        def slow_response(*args, **kwargs):
+            time.sleep(0.05)
+            return self.token_response()
+
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(manager.get())) for _ in range(8)]
+
+        # Act
+        with patch.object(manager.session, "post", side_effect=slow_response) as mock_post:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Assert
+        assert mock_post.call_count == 1
+        assert all(token is tokens[0] for token in tokens)
+
+
+    def test_invalidate_keeps_a_newer_token(self):
+        # Arrange
+        manager = TokenManager("http://0.0.0.0", "user", "password")
+        refused = {"access_token": "refused"}
+        manager.set(refused)
+        newer = {"access_token": "newer"}
+        manager.set(newer)
+
+        # Act
+        manager.invalidate(refused)
+
+        # Assert
+        assert manager.get() is newer
+
+
+    def test_clients_share_the_token(self):
+        # Arrange
+        config = {"environment": {"mediahaven": {"host": "http://shared", "username": "user", "password": "pw"}}}
+        first, second = MediahavenClient(config), MediahavenClient(config)
+
+        # Act
+        first.token_info = {"access_token": "token"}
+
+        # Assert
+        assert first.token_manager is second.token_manager is get_token_manager(config)
+        assert second.token_info == {"access_token": "token"}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_metrics.py
+#
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from prometheus_client import Gauge
+
+import metrics
+from metrics import VRT_RESPONSES
+from vrt_metadata_updater import VrtMetadataUpdater
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestMetrics(unittest.TestCase):
+    def test_update_request_is_counted(self):
+        # Arrange
+        client = MagicMock(circuit_breaker=None)
+        client.post_update_request.return_value.status_code = 503
+        before = VRT_RESPONSES.labels("503")._value.get()
+
+        # Act
+        VrtMetadataUpdater({}, client).request_metadata_update("test1")
+
+        # Assert
+        assert VRT_RESPONSES.labels("503")._value.get() == before + 1
+
+
+    def test_generate_latest(self):
+        # Act
+        exposition = metrics.generate_latest().decode("utf-8")
+
+        # Assert
+        assert "vrt_metadata_updater_vrt_request_seconds_bucket" in exposition
+        assert "vrt_metadata_updater_mediahaven_page_seconds_count" in exposition
+
+
+
+    def test_import_creates_multiprocess_dir(self):
+        # Arrange
+        multiprocess_dir = os.path.join(tempfile.mkdtemp(), "metrics")
+        env = dict(os.environ, prometheus_multiproc_dir=multiprocess_dir)
+
+        # Act
+        result = subprocess.run(
+            [sys.executable, "-c", "import metrics; metrics.RETRIES.labels('test').inc()"],
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+            env=env,
+            stderr=subprocess.PIPE,
+        )
+
+        # Assert
+        assert result.returncode == 0, result.stderr.decode("utf-8")
+        assert os.listdir(multiprocess_dir)
+
+
+    def test_gauge_modes_supported_by_pinned_client(self):
+        # Arrange: the multiprocess modes of prometheus-client 0.7.1, see requirements.txt
+        modes = {"min", "max", "livesum", "liveall", "all"}
+        gauges = [value for value in vars(metrics).values() if isinstance(value, Gauge)]
+
+        # Act & Assert
+        assert gauges
+        for gauge in gauges:
+            assert gauge._multiprocess_mode in modes, gauge._name
+
+
+if __name__ == "__main__":
+    unittest.main()
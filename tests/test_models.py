@@ -31,5 +31,12 @@ class TestModels(unittest.TestCase):
             test_mediaobject = MediaObject()
 
 
+    def test_status_is_indexed(self):
+        indexed_columns = [
+            column.name for index in MediaObject.__table__.indexes for column in index.columns
+        ]
+        assert 'status' in indexed_columns
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_ratelimiter.py
+#
+
+import os
+import sys
+import time
+import unittest
+
+from ratelimiter import ConcurrencyLimit, TokenBucket
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_unlimited(self):
+        # Arrange
+        bucket = TokenBucket()
+
+        # Act
+        waited = sum(bucket.acquire() for _ in range(100))
+
+        # Assert
+        assert waited == 0
+
+
+    def test_burst_then_rate(self):
+        # Arrange
+        bucket = TokenBucket(rate=50, burst=5)
+
+        # Act
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        burst_duration = time.monotonic() - start
+        for _ in range(10):
+            bucket.acquire()
+        duration = time.monotonic() - start
+
+        # Assert
+        assert burst_duration < 0.05
+        assert 0.19 <= duration < 0.35
+
+
+    def test_slow_down_and_recover(self):
+        # Arrange
+        bucket = TokenBucket(rate=10, min_rate=2, recovery_steps=4)
+
+        # Act
+        bucket.report(429)
+        slowed_down = bucket.rate
+        bucket.report(503)
+        bucket.report(503)
+        floor = bucket.rate
+        for _ in range(10):
+            bucket.report(200)
+
+        # Assert
+        assert slowed_down == 5
+        assert floor == 2
+        assert bucket.rate == 10
+
+
+    def test_reserve_does_not_block(self):
+        # Arrange
+        bucket = TokenBucket(rate=10, burst=1)
+
+        # Act
+        start = time.monotonic()
+        delays = [bucket.reserve() for _ in range(3)]
+
+        # Assert
+        assert time.monotonic() - start < 0.05
+        assert delays[0] == 0
+        assert 0.09 < delays[1] < 0.11
+        assert 0.19 < delays[2] < 0.21
+
+
+
+class TestConcurrencyLimit(unittest.TestCase):
+    def test_decrease_and_recover(self):
+        # Arrange
+        limit = ConcurrencyLimit(limit=8, min_limit=2)
+
+        # Act
+        limit.report(503)
+        halved = limit.limit
+        limit.report(None)
+        limit.report(429)
+        floor = limit.limit
+        for _ in range(3):
+            limit.report(200)
+        grown = limit.limit
+        for _ in range(100):
+            limit.report(200)
+
+        # Assert
+        assert halved == 4
+        assert floor == 2
+        assert grown == 3
+        assert limit.limit == 8
+
+
+if __name__ == "__main__":
+    unittest.main()
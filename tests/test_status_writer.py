@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_status_writer.py
+#
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import MediaObject
+from status_writer import StatusWriter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class TestStatusWriter(unittest.TestCase):
+    def test_flush_per_batch(self):
+        # Arrange
+        media_objects = [MediaObject(f'test{i}') for i in range(5)]
+
+        # Act
+        with patch("status_writer.db_session") as session:
+            status_writer = StatusWriter(batch_size=2, flush_interval=60)
+            for media_object in media_objects:
+                status_writer.add(media_object)
+            calls_before_flush = session.execute.call_count
+            status_writer.flush()
+
+        # Assert
+        assert calls_before_flush == 2
+        assert session.execute.call_count == 3
+        assert session.commit.call_count == 3
+        assert len(session.execute.call_args[0][1]) == 1
+
+
+    def test_flush_after_interval(self):
+        # Act
+        with patch("status_writer.db_session") as session:
+            status_writer = StatusWriter(batch_size=100, flush_interval=0)
+            status_writer.add(MediaObject('test1'))
+
+        # Assert
+        assert session.execute.call_count == 1
+        assert status_writer.buffer == []
+
+
+    def test_flush_failed(self):
+        # Act
+        with patch("status_writer.db_session") as session:
+            session.execute.side_effect = SQLAlchemyError()
+            status_writer = StatusWriter(batch_size=1)
+            status_writer.add(MediaObject('test1'))
+
+        # Assert
+        assert session.rollback.call_count == 1
+        assert status_writer.buffer == []
+
+
+if __name__ == "__main__":
+    unittest.main()
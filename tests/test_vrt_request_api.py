@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  tests/test_vrt_request_api.py
+#
+
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Tuple
+from unittest.mock import patch
+
+from requests import RequestException
+
+from circuitbreaker import OPEN, CircuitBreaker, circuit_breaker_from_config
+from vrt_metadata_updater import VrtMetadataUpdater
+from vrt_request_api import VrtRequestApiClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+mock_config = {
+    "environment": {
+        "vrt_request_api": {
+            "host": "http://0.0.0.0",
+            "pool_size": 4,
+            "retries": 3,
+            "backoff_factor": 0,
+        },
+    },
+}
+
+
+class TestVrtRequestApiClient(unittest.TestCase):
+    def test_pool_and_retry_config(self):
+        # Act
+        client = VrtRequestApiClient(mock_config)
+        adapter = client.session.get_adapter("https://0.0.0.0")
+
+        # Assert
+        assert adapter._pool_maxsize == 4
+        assert adapter.max_retries.total == 3
+        assert client.session.get_adapter("http://0.0.0.0") is adapter
+
+
+    def test_session_reused_between_requests(self):
+        # Arrange
+        client = VrtRequestApiClient(mock_config)
+
+        # Act
+        with patch.object(client.session, "post") as mock_post:
+            client.post_update_request({"media_id": "1"})
+            client.post_update_request({"media_id": "2"})
+
+        # Assert
+        assert mock_post.call_count == 2
+        mock_post.assert_called_with("http://0.0.0.0", data=json.dumps({"media_id": "2"}))
+
+
+    def test_batch_update_request(self):
+        # Arrange
+        client = VrtRequestApiClient(mock_config)
+        client.batch_host = "http://0.0.0.0/batch"
+
+        # Act
+        with patch.object(client.session, "post") as mock_post:
+            client.post_batch_update_request([{"media_id": "1"}, {"media_id": "2"}])
+
+        # Assert
+        mock_post.assert_called_once_with(
+            "http://0.0.0.0/batch",
+            data=json.dumps({"requests": [{"media_id": "1"}, {"media_id": "2"}]}),
+        )
+
+
+    def test_batch_update_request_needs_batch_host(self):
+        # Arrange
+        client = VrtRequestApiClient(mock_config)
+
+        # Act & Assert
+        with patch.object(client.session, "post") as mock_post:
+            with self.assertRaises(ValueError):
+                client.post_batch_update_request([{"media_id": "1"}])
+        mock_post.assert_not_called()
+
+
+    def test_defaults_without_config(self):
+        # Act
+        client = VrtRequestApiClient({"concurrency": 16})
+
+        # Assert
+        assert client.pool_size == 16
+        assert client.host is None
+
+
+
+    def serve_unavailable(self) -> Tuple[dict, list]:
+        """Starts a local server that answers every update request with a 503.
+
+        Returns:
+            Tuple[dict, list] -- a config for the server and the paths it was sent
+        """
+        calls = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                calls.append(self.path)
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        config = {
+            "environment": {
+                "vrt_request_api": {
+                    "host": f"http://127.0.0.1:{server.server_port}",
+                    "retries": 10,
+                    "backoff_factor": 0,
+                }
+            },
+            "circuit_breaker_error_rate": 1,
+            "circuit_breaker_window": 3,
+        }
+        return config, calls
+
+
+    def test_circuit_breaker_opens_during_retries(self):
+        # Arrange: a server that is down
+        config, calls = self.serve_unavailable()
+        circuit_breaker = CircuitBreaker(error_rate=1, window=3)
+        client = VrtRequestApiClient(config, circuit_breaker)
+
+        # Act
+        with self.assertRaises(RequestException):
+            client.post_update_request({"media_id": "1"})
+
+        # Assert: given up after the window instead of after 11 attempts
+        assert len(calls) == 3
+        assert circuit_breaker.state == OPEN
+
+
+    def test_updaters_share_the_circuit_breaker_of_the_client(self):
+        # Arrange: a run and a /progress request on the client app.py shares
+        config, calls = self.serve_unavailable()
+        client = VrtRequestApiClient(config, circuit_breaker_from_config(config, "vrt_request_api"))
+        run = VrtMetadataUpdater(config, client)
+        VrtMetadataUpdater(config, client)
+
+        # Act
+        updated = run.request_metadata_update("test1")
+
+        # Assert: the breaker of the run saw the retried attempts and opened
+        assert not updated
+        assert len(calls) == 3
+        assert run.circuit_breaker is client.circuit_breaker
+        assert run.circuit_breaker.state == OPEN
+
+
+if __name__ == "__main__":
+    unittest.main()
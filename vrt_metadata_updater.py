@@ -6,69 +6,282 @@
 #  vrt_metadata_updater.py
 #
 
+import asyncio
 import functools
 import json
 import logging
 import sys
 import time
-from datetime import datetime
-from typing import Dict, List
+from contextlib import closing
+from datetime import datetime, timedelta
+from itertools import chain, takewhile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import aiohttp
 
 import requests
 import structlog
 import yaml
 from requests.exceptions import RequestException
-from requests.packages.urllib3.util import Retry
-from requests.adapters import HTTPAdapter
-from requests import Session
+from sqlalchemy import and_, case, func, or_
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql.expression import insert
 from viaa.configuration import ConfigParser
 from viaa.observability import logging
 
-from database import db_session, init_db
-from models import MediaObject
+from async_clients import AsyncMediahavenClient, AsyncVrtRequestApiClient
+from circuitbreaker import CircuitBreaker, circuit_breaker_from_config
+from database import db_session, init_db, insert_ignore
+from dispatcher import Dispatcher, batched
+from harvester import PartitionedHarvester
+from leases import LeaseManager
+from media_ids import SeenMediaIds, compact_media_ids, normalize_media_id
+from models import HarvestState, MediaObject
 from mediahaven import MediahavenClient
+from metrics import (
+    CONCURRENCY_LIMIT,
+    DB_WRITE_SECONDS,
+    IN_FLIGHT,
+    QUEUE_DEPTH,
+    VRT_REQUEST_SECONDS,
+    VRT_RESPONSES,
+)
+from ratelimiter import ConcurrencyLimit, TokenBucket
+from status_writer import StatusWriter
+from vrt_request_api import VrtRequestApiClient
 
 logger = logging.get_logger(config=ConfigParser())
 
+insert_media_objects = insert_ignore(MediaObject.__table__)
+
+# Shared by all updaters in this process, /progress creates a new one per request
+progress_cache: dict = {"progress": None, "expires_at": 0}
+
 class VrtMetadataUpdater():
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, vrt_request_api_client: VrtRequestApiClient = None):
         self.cfg: dict = config
         self.token_info = None
+        # every failed attempt counts, not only the outcome of a whole retry chain, so
+        # the breaker belongs to the client. A shared client keeps its own breaker.
+        if vrt_request_api_client is None:
+            vrt_request_api_client = VrtRequestApiClient(
+                config, circuit_breaker_from_config(config, "vrt_request_api")
+            )
+        self.vrt_request_api_client: VrtRequestApiClient = vrt_request_api_client
+        self.circuit_breaker: CircuitBreaker = (
+            vrt_request_api_client.circuit_breaker
+            or circuit_breaker_from_config(config, "vrt_request_api")
+        )
+        self.rate_limiter = TokenBucket(
+            rate=self.__get_max_requests_per_second(),
+            burst=self.cfg.get("burst_size", 1),
+        )
+        self.update_batch_size: int = self.cfg.get("update_batch_size", 1)
+        if self.update_batch_size > 1 and not self.vrt_request_api_client.batch_host:
+            logger.warning(
+                "update_batch_size is set without environment.vrt_request_api.batch_host, "
+                "sending update requests one by one."
+            )
+            self.update_batch_size = 1
+        # follows what the VRT request API can take, between min_concurrency and concurrency
+        self.concurrency_limit = ConcurrencyLimit(
+            limit=self.cfg.get("concurrency", 1),
+            min_limit=self.cfg.get("min_concurrency", 1),
+        )
+        self.is_cancelled: Callable[[], bool] = lambda: False
+        # media ids are stored and sent without surrounding whitespace, in their own case
+        self.seen_media_ids = SeenMediaIds(
+            self.cfg.get("seen_media_ids_max", 1000000),
+            fold_case=self.cfg.get("media_id_fold_case", False),
+        )
+        # why the last update request of a media id failed, until its status is stored
+        self.last_errors: Dict[str, str] = dict()
+        self.status_writer = StatusWriter(
+            batch_size=self.cfg.get("status_batch_size", 100),
+            flush_interval=self.cfg.get("status_flush_interval", 5),
+        )
+
+
+    def __get_max_requests_per_second(self) -> float:
+        """Returns the configured rate, falling back to the older `throttle_time`."""
+        if self.cfg.get("max_requests_per_second"):
+            return self.cfg["max_requests_per_second"]
+        if self.cfg.get("throttle_time"):
+            return 1 / self.cfg["throttle_time"]
+        return 0
 
 
-    def write_media_objects_to_db(self, media_objects: List[MediaObject]) -> None:
+    def write_media_objects_to_db(self, media_objects: List[MediaObject]) -> bool:
         """Add the media_objects to the database if they don't exist, otherwise ignore them.
 
         Arguments:
             media_objects {List} -- objects containing the vrt_media_id
+
+        Returns:
+            bool -- True if the media objects were written, False if failed
+        """
+        return self.write_media_ids_to_db(
+            [media_object.vrt_media_id for media_object in media_objects]
+        )
+
+
+    def write_media_ids_to_db(self, media_ids: List[str], commit: bool = True) -> bool:
+        """Adds the media ids with status 0 if they don't exist, otherwise ignores them.
+
+        The media ids are normalized first, and the ones already written during this
+        run are dropped. No MediaObject instances are built, a single executemany
+        writes all of them.
+
+        Arguments:
+            media_ids {List} -- the vrt media ids
+
+        Keyword Arguments:
+            commit {bool} -- False to leave the transaction open for more pages (default: {True})
+
+        Returns:
+            bool -- True if the media ids were written, False if failed
         """
-        media_objects_as_dict = [media_object.get_dict() for media_object in media_objects]
+        media_ids = self.seen_media_ids.filter_new(
+            normalize_media_id(media_id) for media_id in media_ids
+        )
+        if not media_ids:
+            return True
+        now = datetime.now()
         try:
-            db_session.execute(MediaObject.__table__.insert(prefixes=['OR IGNORE']), media_objects_as_dict)
-            db_session.commit()
+            with DB_WRITE_SECONDS.labels("media_ids").time():
+                db_session.execute(
+                    insert_media_objects,
+                    [{"vrt_media_id": media_id, "status": 0, "last_update": now} for media_id in media_ids],
+                )
+                if commit:
+                    db_session.commit()
         except SQLAlchemyError as exception:
             db_session.rollback()
+            # uncommitted pages before this one were rolled back as well
+            self.seen_media_ids.clear()
             logger.warning("Something went wrong when trying to write media id's to the database.")
+            return False
+        return True
 
 
-    def process_media_objects(self, list_of_media_objects: List[MediaObject]) -> None:
-        """Requests a metadata update and updates the status for all media objects."""
-        for obj in list_of_media_objects:
-            success = self.request_metadata_update(obj.vrt_media_id.strip())
-            obj.last_update = datetime.now()
-            if success:
-                obj.status = 1
+    def get_media_ids(self, media_data: dict) -> List[str]:
+        """Returns the normalized dc_identifier_localid of the items on a page that have one."""
+        media_ids = list()
+        for item in media_data["MediaDataList"]:
+            if "dc_identifier_localid" in item["Dynamic"]:
+                media_ids.append(normalize_media_id(item["Dynamic"]["dc_identifier_localid"]))
+            else:
+                logger.debug(f'Item without localid found: {json.dumps(item)}')
+        return media_ids
+
+
+    def process_media_objects(self, list_of_media_objects: Iterable[MediaObject]) -> None:
+        """Requests a metadata update and updates the status for all media objects.
+
+        Up to `concurrency` update requests are kept in flight, started no faster than
+        the rate limiter allows. Both back off while the VRT request API pushes back, and
+        no requests are sent while the circuit breaker is open.
+        """
+        # stop handing out work as soon as the run is cancelled
+        media_objects = takewhile(lambda obj: not self.is_cancelled(), list_of_media_objects)
+        batch_size: int = self.update_batch_size
+        if batch_size > 1:
+            # one request per `update_batch_size` media objects
+            dispatcher = Dispatcher(
+                lambda batch: self.request_metadata_updates(
+                    [obj.vrt_media_id.strip() for obj in batch]
+                ),
+                rate_limiter=self.rate_limiter,
+                concurrency_limit=self.concurrency_limit,
+                circuit_breaker=self.circuit_breaker,
+            )
+            items, on_result = batched(media_objects, batch_size), self.__update_statuses
+        else:
+            dispatcher = Dispatcher(
+                lambda obj: self.request_metadata_update(obj.vrt_media_id.strip()),
+                rate_limiter=self.rate_limiter,
+                concurrency_limit=self.concurrency_limit,
+                circuit_breaker=self.circuit_breaker,
+            )
+            items, on_result = media_objects, self.__update_status
+        try:
+            dispatcher.dispatch(items, on_result)
+        finally:
+            self.status_writer.flush()
+
+
+    def __update_statuses(self, batch: List[MediaObject], results: Dict[str, bool]) -> None:
+        """Stores the outcome of a batch update request for each of its media objects."""
+        for obj in batch:
+            self.__update_status(obj, results.get(obj.vrt_media_id.strip(), False))
+
+
+    def __update_status(self, obj: MediaObject, success: bool) -> None:
+        """Stores the outcome of an update request for a media object.
+
+        A failed media object is retried after an exponential backoff of
+        `retry_backoff` seconds, doubling per attempt up to `retry_backoff_max`. After
+        `max_attempts` failed attempts it is given up (status 3).
+
+        The status is written in batches by the status writer, so the object does not
+        have to be attached to the session.
+        """
+        now = datetime.now()
+        obj.last_update = now
+        error = self.last_errors.pop(obj.vrt_media_id.strip(), None)
+        if success:
+            obj.status = 1
+            obj.next_attempt_at = None
+        else:
+            obj.attempts = (obj.attempts or 0) + 1
+            obj.last_error = error
+            max_attempts: int = self.cfg.get("max_attempts", 10)
+            if max_attempts and obj.attempts >= max_attempts:
+                obj.status = 3
+                obj.next_attempt_at = None
             else:
                 obj.status = 2
-            try:
-                db_session.commit()
-                end = int(time.time())
-            except SQLAlchemyError as exception:
-                db_session.rollback()
-                logger.warning(f"Failed to update the status of {obj.vrt_media_id}.")
-            time.sleep(self.cfg["throttle_time"])
+                backoff: float = self.cfg.get("retry_backoff", 300) * 2 ** (obj.attempts - 1)
+                obj.next_attempt_at = now + timedelta(
+                    seconds=min(backoff, self.cfg.get("retry_backoff_max", 86400))
+                )
+        self.status_writer.add(obj)
+
+
+    def __retry_is_due(self):
+        """Returns the criterion for failed media objects whose backoff has expired."""
+        return and_(
+            MediaObject.status == 2,
+            or_(MediaObject.next_attempt_at.is_(None), MediaObject.next_attempt_at <= datetime.now()),
+        )
+
+
+    def iter_pending_media_objects(self) -> Iterator[MediaObject]:
+        """Yields the media objects that were never sent, then the failed ones that are
+        due for a retry, so fresh work goes first.
+        """
+        yield from self.iter_media_objects(MediaObject.status == 0)
+        yield from self.iter_media_objects(self.__retry_is_due())
+
+
+    def __report(self, status_code: Optional[int]) -> None:
+        """Lets the flow control adapt to a response of the VRT request API, None when
+        there was no response.
+        """
+        if status_code is not None:
+            self.rate_limiter.report(status_code)
+        self.concurrency_limit.report(status_code)
+        self.circuit_breaker.report(status_code)
+        CONCURRENCY_LIMIT.set(self.concurrency_limit.limit)
+
+
+    def __get_payload(self, media_id: str) -> dict:
+        """Returns the body of an update request for a media id."""
+        return {
+            "media_id": media_id,
+            "media_type": "metadata",
+            "destination": "mediahaven",
+        }
 
 
     def request_metadata_update(self, media_id: str) -> bool:
@@ -80,28 +293,24 @@ class VrtMetadataUpdater():
         Returns:
             bool -- True if the call was succesful, False if failed
         """
-        payload = {
-            "media_id": media_id,
-            "media_type": "metadata",
-            "destination": "mediahaven",
-        }
+        payload = self.__get_payload(media_id)
 
         logger.info(
             "creating vrt metadata update request", vrt_media_id=media_id, request=payload
         )
 
-        retries = Retry(total=10, backoff_factor=0.5, status_forcelist=[ 500, 502, 503, 504, 521], method_whitelist=frozenset(['GET', 'POST']))
-        s = Session()
-        s.mount('http://', HTTPAdapter(max_retries=retries))
-        s.mount('https://', HTTPAdapter(max_retries=retries))
-
         try:
-            response = s.post(
-                self.cfg["environment"]["vrt_request_api"]["host"], data=json.dumps(payload)
-            )
+            with IN_FLIGHT.track_inprogress(), VRT_REQUEST_SECONDS.time():
+                response = self.vrt_request_api_client.post_update_request(payload)
         except RequestException as exception:
+            VRT_RESPONSES.labels("error").inc()
+            self.__report(None)
             logger.warning(f"Something went wrong trying update metadata: {str(exception)}")
+            self.last_errors[media_id] = str(exception)
+            return False
 
+        VRT_RESPONSES.labels(str(response.status_code)).inc()
+        self.__report(response.status_code)
         if response.status_code == 200 and response.json()["status"] == "OK":
             logger.info(
                 "vrt metadata update request successful",
@@ -110,84 +319,592 @@ class VrtMetadataUpdater():
             )
             return True
         else:
+            self.last_errors[media_id] = f"Status code {response.status_code}: {response.text[:200]}"
             return False
 
 
+    def request_metadata_updates(self, media_ids: List[str]) -> Dict[str, bool]:
+        """Sends one update request for several media ids.
+
+        When the batch request fails as a whole, each media id is requested on its own.
+
+        Arguments:
+            media_ids {List} -- the VRT Media IDs to be updated
+
+        Returns:
+            Dict -- for each media id, True if the call was succesful, False if failed
+        """
+        payloads = [self.__get_payload(media_id) for media_id in media_ids]
+        logger.info("creating vrt metadata batch update request", vrt_media_ids=media_ids)
+
+        try:
+            with IN_FLIGHT.track_inprogress(), VRT_REQUEST_SECONDS.time():
+                response = self.vrt_request_api_client.post_batch_update_request(payloads)
+            VRT_RESPONSES.labels(str(response.status_code)).inc()
+            self.__report(response.status_code)
+            if response.status_code != 200:
+                raise ValueError(f"Status code {response.status_code}")
+            statuses: Dict[str, str] = {
+                result["media_id"]: result.get("status") for result in response.json()["results"]
+            }
+        except (RequestException, ValueError, KeyError, TypeError) as exception:
+            if isinstance(exception, RequestException):
+                VRT_RESPONSES.labels("error").inc()
+                self.__report(None)
+            logger.warning(f"Batch update request failed, sending one by one: {str(exception)}")
+            results: Dict[str, bool] = dict()
+            for media_id in media_ids:
+                self.circuit_breaker.acquire()
+                self.rate_limiter.acquire()
+                results[media_id] = self.request_metadata_update(media_id)
+            return results
+
+        results = dict()
+        for media_id in media_ids:
+            results[media_id] = statuses.get(media_id) == "OK"
+            if not results[media_id]:
+                self.last_errors[media_id] = f"Status in batch: {statuses.get(media_id)}"
+        return results
+
+
     def get_progress(self) -> str:
         """Returns the current status of the script as a JSON string.
         items_in_db = all items in db
         no_update_request = media id from mediahaven is in the database but no updaterequest has been done
         update_requests_succes = a metadata update has been requested and api returned success
         update_requests_failed = a metadata update has been requested but api returned failed
+        update_requests_given_up = the update request failed `max_attempts` times, it is no longer retried
+        requests_per_second = update requests handled per second over the last `throughput_window` seconds
+        eta_seconds = estimated time until all items that are not given up have been requested again
+
+        The result is cached for `progress_cache_ttl` seconds, so frequent polling does
+        not compete with the updater for the database.
 
         Returns:
             str -- for each status show the number of items
         """
-        amount_in_status_0 = (
-            db_session.query(MediaObject).filter(MediaObject.status == 0).count()
-        )
-        amount_in_status_1 = (
-            db_session.query(MediaObject).filter(MediaObject.status == 1).count()
-        )
-        amount_in_status_2 = (
-            db_session.query(MediaObject).filter(MediaObject.status == 2).count()
+        now = time.monotonic()
+        if progress_cache["progress"] is not None and now < progress_cache["expires_at"]:
+            return progress_cache["progress"]
+
+        window: int = self.cfg.get("throughput_window", 60)
+        since = datetime.now() - timedelta(seconds=window)
+        # a single scan that counts each status and how many were updated recently
+        rows = (
+            db_session.query(
+                MediaObject.status,
+                func.count(MediaObject.vrt_media_id),
+                func.sum(case([(MediaObject.last_update >= since, 1)], else_=0)),
+            )
+            .group_by(MediaObject.status)
+            .all()
         )
-        progress = {
-            "items_in_db": amount_in_status_0 + amount_in_status_1 + amount_in_status_2,
+        # PostgreSQL sums to a Decimal, which is not JSON serializable
+        amounts = {status: int(amount) for status, amount, _ in rows}
+        recent = {status: int(amount_recent or 0) for status, _, amount_recent in rows}
+
+        amount_in_status_0 = amounts.get(0, 0)
+        amount_in_status_1 = amounts.get(1, 0)
+        amount_in_status_2 = amounts.get(2, 0)
+        amount_in_status_3 = amounts.get(3, 0)
+        requests_per_second = (recent.get(1, 0) + recent.get(2, 0) + recent.get(3, 0)) / window
+        progress = json.dumps({
+            "items_in_db": sum(amounts.values()),
             "no_update_request": amount_in_status_0,
             "update_requests_succes": amount_in_status_1,
             "update_requests_failed": amount_in_status_2,
+            "update_requests_given_up": amount_in_status_3,
+            "requests_per_second": round(requests_per_second, 2),
+            "eta_seconds": (
+                round((amount_in_status_0 + amount_in_status_2) / requests_per_second)
+                if requests_per_second
+                else None
+            ),
+        })
+
+        progress_cache["progress"] = progress
+        progress_cache["expires_at"] = now + self.cfg.get("progress_cache_ttl", 5)
+        return progress
+
+
+    def iter_media_objects(self, *criterion) -> Iterator[MediaObject]:
+        """Yields the media objects matching the criteria, one chunk at a time.
+
+        The chunks are paginated on vrt_media_id instead of using an offset, so rows
+        that change status while iterating are neither skipped nor read twice. Every
+        chunk is detached from the session, which keeps its identity map small.
+
+        Arguments:
+            criterion -- filters for the media objects, e.g. `MediaObject.status == 0`
+
+        Yields:
+            MediaObject -- detached media objects ordered by vrt_media_id
+        """
+        chunk_size: int = self.cfg.get("db_chunk_size", 1000)
+        last_media_id = None
+
+        while True:
+            query = db_session.query(MediaObject).filter(*criterion)
+            if last_media_id is not None:
+                query = query.filter(MediaObject.vrt_media_id > last_media_id)
+            chunk: List[MediaObject] = (
+                query.order_by(MediaObject.vrt_media_id).limit(chunk_size).all()
+            )
+            db_session.expunge_all()
+            if not chunk:
+                return
+            yield from chunk
+            last_media_id = chunk[-1].vrt_media_id
+
+
+    def harvest(
+        self,
+        pages: Iterable[dict],
+        watermark: datetime = None,
+        offset: int = 0,
+        modified_since: datetime = None,
+    ) -> Iterator[List[str]]:
+        """Writes the media ids of every page to the database.
+
+        Every `harvest_pages_per_transaction` pages are committed together with the
+        offset of the next page as a checkpoint, so an interrupted harvest can be
+        resumed. Stops after `max_amount_to_process` media ids when that is configured,
+        or when a page could not be written. Only when all pages were harvested, the
+        watermark is stored for the next run.
+
+        Arguments:
+            pages {Iterable} -- pages of fragments as returned by MediaHaven
+
+        Keyword Arguments:
+            watermark {datetime} -- when this harvest started, in UTC (default: {None})
+            offset {int} -- the offset of the first page (default: {0})
+            modified_since {datetime} -- the query the pages were fetched with (default: {None})
+
+        Yields:
+            List -- the media ids of a page, after they have been written
+        """
+        number_of_media_ids = 0
+        max_amount_to_process = self.cfg["max_amount_to_process"]
+        checkpoint = self.__new_checkpoint(watermark, offset, modified_since)
+
+        for media_data in pages:
+            if self.is_cancelled():
+                break
+            media_ids = self.__write_harvested_page(media_data, checkpoint)
+            if media_ids is None:
+                break
+            yield media_ids
+            # update amount of items processed
+            number_of_media_ids += len(media_ids)
+            if max_amount_to_process and number_of_media_ids >= max_amount_to_process:
+                break
+        else:
+            self.__finish_harvest(checkpoint, completed=True)
+            return
+        self.__finish_harvest(checkpoint, completed=False)
+
+
+    def __new_checkpoint(self, watermark: datetime, offset: int, modified_since: datetime) -> dict:
+        """Returns the state of a harvest that is kept up to date page by page."""
+        pages_per_transaction: int = self.cfg.get("harvest_pages_per_transaction", 1)
+        if self.cfg.get("streaming") or self.cfg.get("async_updates"):
+            # statuses are written on the same session while harvesting, their
+            # rollback must not take uncommitted pages with it
+            pages_per_transaction = 1
+        return {
+            "watermark": watermark,
+            "offset": offset,
+            "modified_since": modified_since,
+            "uncommitted_pages": 0,
+            "pages_per_transaction": pages_per_transaction,
         }
 
-        return json.dumps(progress)
+
+    def __write_harvested_page(self, media_data: dict, checkpoint: dict) -> Optional[List[str]]:
+        """Writes the media ids of a page, committing with a checkpoint every
+        `harvest_pages_per_transaction` pages.
+
+        Returns:
+            List -- the media ids of the page, None if it could not be written
+        """
+        media_ids = self.get_media_ids(media_data)
+        if not self.write_media_ids_to_db(media_ids, commit=False):
+            # the pages since the last checkpoint are rolled back, resume from there
+            checkpoint["uncommitted_pages"] = 0
+            return None
+        checkpoint["offset"] += len(media_data["MediaDataList"])
+        checkpoint["uncommitted_pages"] += 1
+        if checkpoint["uncommitted_pages"] >= checkpoint["pages_per_transaction"]:
+            if not self.__save_checkpoint(checkpoint):
+                # the pages are written in the transaction of the checkpoint
+                return None
+        return media_ids
+
+
+    def __save_checkpoint(self, checkpoint: dict) -> bool:
+        """Commits the uncommitted pages with the offset of the next page.
+
+        Returns:
+            bool -- True if committed, False if the pages were rolled back
+        """
+        saved = self.__save_harvest_state(
+            checkpoint_offset=checkpoint["offset"],
+            checkpoint_modified_since=checkpoint["modified_since"],
+            checkpoint_started_at=checkpoint["watermark"],
+        )
+        checkpoint["uncommitted_pages"] = 0
+        return saved
+
+
+    def __finish_harvest(self, checkpoint: dict, completed: bool) -> None:
+        """Stores the watermark of a complete harvest, or where a stopped one can resume."""
+        if completed:
+            # the next harvest starts over (from the watermark)
+            if checkpoint["watermark"] is not None:
+                self.__save_harvest_state(watermark=checkpoint["watermark"], checkpoint_offset=None)
+            else:
+                self.__save_harvest_state(checkpoint_offset=None)
+        elif checkpoint["uncommitted_pages"]:
+            self.__save_checkpoint(checkpoint)
+
+
+    def __save_harvest_state(self, **values) -> bool:
+        """Stores the given columns of the harvest state of the configured media type,
+        committing the pages written since the last commit with it.
+
+        Returns:
+            bool -- True if stored, False if rolled back
+        """
+        media_type: str = self.cfg["media_type"]
+        try:
+            updated = db_session.query(HarvestState).filter(
+                HarvestState.media_type == media_type
+            ).update(values)
+            if not updated:
+                harvest_state = HarvestState(media_type)
+                for column, value in values.items():
+                    setattr(harvest_state, column, value)
+                db_session.add(harvest_state)
+            db_session.commit()
+        except SQLAlchemyError as exception:
+            db_session.rollback()
+            # uncommitted pages were rolled back as well, let their ids be written again
+            self.seen_media_ids.clear()
+            logger.warning("Failed to store the harvest state.")
+            return False
+        return True
+
+
+    def __harvest_partitioned(
+        self,
+        mediahaven_client: MediahavenClient,
+        total: int,
+        modified_since: datetime,
+        watermark: datetime,
+    ) -> None:
+        """Harvests with `harvest_workers` workers, stores the watermark if all is harvested."""
+        max_amount_to_process = self.cfg["max_amount_to_process"]
+        if max_amount_to_process and max_amount_to_process < total:
+            total, watermark = max_amount_to_process, None
+
+        harvester = PartitionedHarvester(
+            mediahaven_client,
+            lambda media_data: self.write_media_ids_to_db(self.get_media_ids(media_data)),
+            workers=self.cfg["harvest_workers"],
+            partition_pages=self.cfg.get("harvest_partition_pages", 10),
+            page_size=self.cfg["nr_of_results"],
+            is_cancelled=self.is_cancelled,
+        )
+        if harvester.harvest(self.cfg["media_type"], total, modified_since) and watermark:
+            self.__save_harvest_state(watermark=watermark)
+
+
+    def stream_pending_media_objects(
+        self, harvested: Iterable[List[str]]
+    ) -> Iterator[MediaObject]:
+        """Yields the media objects of the harvested ids that still need an update.
+
+        Only one page at a time is kept in memory, the dispatcher pulls the next page
+        in as soon as it has room for more requests.
+
+        Arguments:
+            harvested {Iterable} -- the media ids per page, see `harvest`
+        """
+        for media_ids in harvested:
+            # stay below SQLite's limit on the number of variables in a query
+            for i in range(0, len(media_ids), 500):
+                pending: List[MediaObject] = db_session.query(MediaObject).filter(
+                    MediaObject.vrt_media_id.in_(media_ids[i : i + 500]),
+                    or_(MediaObject.status == 0, self.__retry_is_due()),
+                ).all()
+                db_session.expunge_all()
+                yield from pending
+
+
+    def __get_harvest_start(self) -> Tuple[datetime, datetime, int]:
+        """Returns since when items are harvested, the watermark and the offset to start at.
+
+        With a watermark only the items that changed since the last harvest are needed.
+        An interrupted harvest with the same query is resumed at its checkpoint.
+        """
+        modified_since: datetime = None
+        harvest_state: HarvestState = db_session.query(HarvestState).get(self.cfg["media_type"])
+        if self.cfg.get("incremental_harvest") and harvest_state and harvest_state.watermark:
+            modified_since = harvest_state.watermark
+        watermark = datetime.utcnow()
+
+        offset = 0
+        if (
+            harvest_state
+            and harvest_state.checkpoint_offset
+            and harvest_state.checkpoint_modified_since == modified_since
+        ):
+            offset = harvest_state.checkpoint_offset
+            watermark = harvest_state.checkpoint_started_at or watermark
+            logger.debug(f"Resuming the harvest at offset {offset}.")
+        return modified_since, watermark, offset
 
 
-    def start(self) -> None:
+    def start(self, is_cancelled: Callable[[], bool] = None) -> None:
+        """Harvests all media ids from MediaHaven and requests an update for them.
+
+        Keyword Arguments:
+            is_cancelled {Callable} -- tells if the run should stop (default: {None})
+        """
         logger.debug("Starting VRT metadata updater...")
+        if is_cancelled:
+            self.is_cancelled = is_cancelled
+
+        if self.cfg.get("async_updates"):
+            asyncio.run(self.start_async())
+            return
 
-        mediahaven_client = MediahavenClient(self.cfg)
+        mediahaven_client = MediahavenClient(
+            self.cfg, TokenBucket(self.cfg.get("mediahaven_max_requests_per_second", 0))
+        )
+        modified_since, watermark, offset = self.__get_harvest_start()
 
         # mediahaven call so we can get total number of results
-        media_data = mediahaven_client.get_fragments()
+        media_data = mediahaven_client.get_fragments(offset=offset, modified_since=modified_since)
 
-        number_of_media_ids = 0
         total_number_of_results = media_data["TotalNrOfResults"]
         total_number_of_items_in_db = db_session.query(MediaObject).count()
 
-        logger.debug(f"{total_number_of_results} items found in MediaHaven.")
+        if modified_since:
+            logger.debug(f"{total_number_of_results} items changed in MediaHaven since {modified_since}.")
+        else:
+            logger.debug(f"{total_number_of_results} items found in MediaHaven.")
+        pages = mediahaven_client.iter_fragment_pages(
+            offset=offset, first_page=media_data, modified_since=modified_since
+        )
+        harvested = self.harvest(pages, watermark, offset, modified_since)
         # If all media ids are already in the database, we skip to step 2
-        if total_number_of_items_in_db == total_number_of_results or self.cfg["skip_mediahaven"]:
+        if self.cfg["skip_mediahaven"] or (
+            not modified_since
+            and not offset
+            and total_number_of_items_in_db == total_number_of_results
+        ):
             logger.debug("All ids already in database, skipping to step 2.")
-            # should skip to step 2
-            number_of_media_ids = total_number_of_results
+        elif self.cfg.get("streaming"):
+            # step 1 and 2 together: the items of each page are sent for update while
+            # the next pages are still being harvested
+            with closing(pages), closing(harvested):
+                self.process_media_objects(self.stream_pending_media_objects(harvested))
+
+            # pick up what was left in the database and the failed items that are due
+            # for a retry, items that failed in this run are still backing off
+            self.process_media_objects(self.iter_pending_media_objects())
+            return
+        elif self.cfg.get("harvest_workers", 1) > 1:
+            # step 1: workers each harvest their own range of pages at the same time
+            self.__harvest_partitioned(
+                mediahaven_client, total_number_of_results, modified_since, watermark
+            )
+        else:
+            # step 1: keep calling the mediahaven-api until all results are received,
+            # the next pages are fetched in the background while a page is written
+            with closing(pages), closing(harvested):
+                for _ in harvested:
+                    pass
+
+        # step 2: send each media object with status 0, and the failed ones that are
+        # due for a retry, for update
+        if self.cfg.get("lease_updates"):
+            # other workers may be sending the same items, see `work`
+            self.work()
+        else:
+            self.process_media_objects(self.iter_pending_media_objects())
 
-        # step 1: keep calling the mediahaven-api until all results are received
-        while number_of_media_ids < total_number_of_results and (
-            number_of_media_ids < self.cfg["max_amount_to_process"]
-            or self.cfg["max_amount_to_process"] == 0
-        ):
-            media_objects = list()
-            # map items to a mediaobject if they have a dc_identifier_localid
-            for item in media_data["MediaDataList"]:
-                if "dc_identifier_localid" in item["Dynamic"]:
-                    media_objects.append(
-                        MediaObject(item["Dynamic"]["dc_identifier_localid"])
-                    )
+
+    def work(self, is_cancelled: Callable[[], bool] = None) -> None:
+        """Sends an update request for the items without a successful one, as one of
+        several workers that share the database.
+
+        Each worker leases its own batches of rows, so no item is sent twice, and
+        stops when no rows are left. Like in `iter_pending_media_objects`, the items
+        that were never sent go first, then the failed ones that are due for a retry.
+
+        Keyword Arguments:
+            is_cancelled {Callable} -- tells if the run should stop (default: {None})
+        """
+        if is_cancelled:
+            self.is_cancelled = is_cancelled
+        lease_manager = LeaseManager(
+            lease_size=self.cfg.get("lease_size", 500),
+            lease_duration=self.cfg.get("lease_duration", 600),
+        )
+        try:
+            self.process_media_objects(
+                chain(
+                    lease_manager.iter_leased(MediaObject.status == 0),
+                    lease_manager.iter_leased(self.__retry_is_due()),
+                )
+            )
+        finally:
+            # rows that were leased but not sent, e.g. after a cancel
+            lease_manager.release()
+
+
+    async def start_async(self) -> None:
+        """asyncio variant of `start`, a single thread keeps `concurrency` requests in flight.
+
+        Pages are harvested while the items of the previous pages are sent for update,
+        like the `streaming` run. Afterwards the items left with status 0 and the failed
+        ones that are due for a retry are sent.
+        Database access stays on the thread of the event loop.
+        """
+        concurrency: int = max(self.cfg.get("concurrency", 1), 1)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async with AsyncMediahavenClient(
+            self.cfg, TokenBucket(self.cfg.get("mediahaven_max_requests_per_second", 0))
+        ) as mediahaven_client, AsyncVrtRequestApiClient(
+            self.cfg, self.circuit_breaker
+        ) as vrt_client:
+            workers = [
+                asyncio.ensure_future(self.__update_worker(vrt_client, queue, index))
+                for index in range(concurrency)
+            ]
+            try:
+                if self.cfg["skip_mediahaven"]:
+                    logger.debug("Skipping the harvest.")
+                    pending: Iterable[MediaObject] = self.iter_pending_media_objects()
                 else:
-                    # Reduce total_number_of_results by one to prevent endless loop
-                    logger.debug(f'Item without localid found: {json.dumps(item)}')
-                    total_number_of_results = total_number_of_results - 1
+                    await self.__harvest_async(mediahaven_client, queue)
+                    # wait for the harvested items, so they are not read again as leftovers
+                    await queue.join()
+                    self.status_writer.flush()
+                    # items that failed in this run are still backing off
+                    pending = self.iter_pending_media_objects()
+
+                for obj in pending:
+                    if self.is_cancelled():
+                        break
+                    await queue.put(obj)
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                self.status_writer.flush()
+
+
+    async def __harvest_async(
+        self, mediahaven_client: AsyncMediahavenClient, queue: asyncio.Queue
+    ) -> None:
+        """Writes every page to the database and queues the items that need an update."""
+        modified_since, watermark, offset = self.__get_harvest_start()
+        checkpoint = self.__new_checkpoint(watermark, offset, modified_since)
+        max_amount_to_process = self.cfg["max_amount_to_process"]
+        number_of_media_ids = 0
+        completed = False
 
-            self.write_media_objects_to_db(media_objects)
-            # update amount of items processed
-            number_of_media_ids += len(media_objects)
-            # get new fragments
-            media_data = mediahaven_client.get_fragments(offset=number_of_media_ids)
+        pages = mediahaven_client.iter_fragment_pages(offset=offset, modified_since=modified_since)
+        try:
+            async for media_data in pages:
+                if self.is_cancelled():
+                    break
+                media_ids = self.__write_harvested_page(media_data, checkpoint)
+                if media_ids is None:
+                    break
+                for obj in self.stream_pending_media_objects([media_ids]):
+                    await queue.put(obj)
+                number_of_media_ids += len(media_ids)
+                if max_amount_to_process and number_of_media_ids >= max_amount_to_process:
+                    break
+            else:
+                completed = True
+        finally:
+            await pages.aclose()
+        self.__finish_harvest(checkpoint, completed)
 
-        # step 2: send each media object with status 0 for update
-        objects: List[MediaObject] = db_session.query(MediaObject).filter(MediaObject.status != 1).all()
 
-        self.process_media_objects(objects)
+    async def __update_worker(
+        self, client: AsyncVrtRequestApiClient, queue: asyncio.Queue, index: int
+    ) -> None:
+        """Sends update requests for the queued media objects until it is cancelled.
+
+        Workers with an index above the concurrency limit pause until it grows again.
+        """
+        while True:
+            while index >= self.concurrency_limit.limit:
+                await asyncio.sleep(0.1)
+            obj: MediaObject = await queue.get()
+            QUEUE_DEPTH.labels("async_updates").set(queue.qsize())
+            try:
+                if not self.is_cancelled():
+                    success = await self.request_metadata_update_async(
+                        client, obj.vrt_media_id.strip()
+                    )
+                    self.__update_status(obj, success)
+            finally:
+                queue.task_done()
+
+
+    async def request_metadata_update_async(
+        self, client: AsyncVrtRequestApiClient, media_id: str
+    ) -> bool:
+        """asyncio variant of `request_metadata_update`.
+
+        Arguments:
+            client {AsyncVrtRequestApiClient} -- an open client
+            media_id {str} -- the VRT Media ID to be updated
+
+        Returns:
+            bool -- True if the call was succesful, False if failed
+        """
+        payload = self.__get_payload(media_id)
+
+        logger.info(
+            "creating vrt metadata update request", vrt_media_id=media_id, request=payload
+        )
+
+        delay = self.circuit_breaker.reserve()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self.circuit_breaker.reserve()
+        await asyncio.sleep(self.rate_limiter.reserve())
+        try:
+            with IN_FLIGHT.track_inprogress(), VRT_REQUEST_SECONDS.time():
+                status_code, body = await client.post_update_request(payload)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            VRT_RESPONSES.labels("error").inc()
+            self.__report(None)
+            logger.warning(f"Something went wrong trying update metadata: {str(exception)}")
+            self.last_errors[media_id] = str(exception) or type(exception).__name__
+            return False
+
+        VRT_RESPONSES.labels(str(status_code)).inc()
+        self.__report(status_code)
+        if status_code == 200 and body and body.get("status") == "OK":
+            logger.info(
+                "vrt metadata update request successful",
+                vrt_media_id=media_id,
+                status_code=status_code,
+            )
+            return True
+        self.last_errors[media_id] = f"Status code {status_code}: {json.dumps(body)[:200]}"
+        return False
 
 
 if __name__ == "__main__":
@@ -199,4 +916,11 @@ if __name__ == "__main__":
     with open(DEFAULT_CFG_FILE, "r") as ymlfile:
         cfg: dict = yaml.load(ymlfile, Loader=yaml.FullLoader)
 
-    VrtMetadataUpdater(cfg).start()
+    if "--worker" in sys.argv[1:]:
+        # only send update requests, next to the pod that harvests
+        VrtMetadataUpdater(cfg).work()
+    elif "--compact-media-ids" in sys.argv[1:]:
+        # one-off: merge the rows stored before media ids were normalized
+        compact_media_ids(fold_case=cfg.get("media_id_fold_case", False))
+    else:
+        VrtMetadataUpdater(cfg).start()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  @Author: Rudolf De Geijter
+#
+#  vrt_request_api.py
+#
+
+import json
+from typing import List, Optional
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import MaxRetryError, ResponseError
+from requests.packages.urllib3.util import Retry
+
+from circuitbreaker import OPEN, CircuitBreaker
+from metrics import RETRIES
+
+DEFAULT_RETRY_STATUS_CODES = [500, 502, 503, 504, 521]
+
+
+class CountingRetry(Retry):
+    """Retry that counts every retry in the retries metric.
+
+    Every failed attempt that is retried is also reported to the circuit breaker of
+    the client, so it does not wait for whole retry chains to end before it opens.
+    Once it is open, the remaining retries are given up.
+    """
+
+    def __init__(self, *args, client: "VrtRequestApiClient" = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client: Optional[VrtRequestApiClient] = client
+
+    def new(self, **kwargs) -> Retry:
+        retry = super().new(**kwargs)
+        retry.client = self.client
+        return retry
+
+    def increment(
+        self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None
+    ) -> Retry:
+        # raises when the retries are exhausted, the caller reports that outcome
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        RETRIES.labels("vrt_request_api").inc()
+        circuit_breaker = self.client.circuit_breaker if self.client else None
+        if circuit_breaker is not None:
+            circuit_breaker.report(response.status if response is not None else None)
+            if circuit_breaker.state == OPEN:
+                raise MaxRetryError(_pool, url, error or ResponseError("circuit breaker open"))
+        return retry
+
+
+class VrtRequestApiClient:
+    """Long-lived client for the VRT request API.
+
+    Owns one pooled session with retries, so connections are kept alive across
+    update requests and across runs. Settings are read from
+    `environment.vrt_request_api` in the config. Failed attempts are reported to
+    `circuit_breaker`, when it is set.
+    """
+
+    def __init__(self, config: dict, circuit_breaker: CircuitBreaker = None):
+        api_cfg: dict = config.get("environment", {}).get("vrt_request_api") or {}
+        self.circuit_breaker: Optional[CircuitBreaker] = circuit_breaker
+        self.host: str = api_cfg.get("host")
+        # no default, the single update endpoint does not accept a batch body
+        self.batch_host: str = api_cfg.get("batch_host")
+        self.pool_size: int = api_cfg.get("pool_size", max(config.get("concurrency", 1), 10))
+
+        retries = CountingRetry(
+            total=api_cfg.get("retries", 10),
+            backoff_factor=api_cfg.get("backoff_factor", 0.5),
+            status_forcelist=api_cfg.get("retry_status_codes", DEFAULT_RETRY_STATUS_CODES),
+            method_whitelist=frozenset(["GET", "POST"]),
+            client=self,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=retries
+        )
+        self.session = Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post_update_request(self, payload: dict) -> Response:
+        """Sends a metadata update request over the shared session.
+
+        Arguments:
+            payload {dict} -- the update request body
+
+        Returns:
+            Response -- the response of the VRT request API
+        """
+        return self.session.post(self.host, data=json.dumps(payload))
+
+    def post_batch_update_request(self, payloads: List[dict]) -> Response:
+        """Sends the update requests of several media ids in one call.
+
+        The body is `{"requests": [payload, ...]}`, the API answers with the outcome
+        per media id as `{"results": [{"media_id": ..., "status": "OK"}, ...]}`.
+
+        Arguments:
+            payloads {List} -- the update request bodies
+
+        Raises:
+            ValueError: when no `batch_host` is configured
+
+        Returns:
+            Response -- the response of the VRT request API
+        """
+        if not self.batch_host:
+            raise ValueError("No batch_host configured for batch update requests")
+        return self.session.post(self.batch_host, data=json.dumps({"requests": payloads}))
+
+    def close(self) -> None:
+        self.session.close()